@@ -2,14 +2,23 @@
 Standalone Gemini Embedding Function for ChromaDB.
 Used by load_document.py for document ingestion.
 """
+import random
+import re
+import sqlite3
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from chromadb import EmbeddingFunction
 except ImportError:
     from chromadb.api.types import EmbeddingFunction
+import numpy as np
+import xxhash
 from google import genai
-from config import GEMINI_API_KEY, EMBEDDING_MODEL
+from google.genai import types
+from config import GEMINI_API_KEY, EMBEDDING_MODEL, EMBEDDING_DIM, EMBEDDING_CACHE_PATH
 
 _client = genai.Client(api_key=GEMINI_API_KEY)
 try:
@@ -18,41 +27,258 @@ except Exception:
     _masked = "(masked)"
 print(f"[GeminiEmbeddingFunction] Initialized model={EMBEDDING_MODEL}, api_key={_masked}")
 
+# Per-request limits of the embed_content API
+MAX_BATCH_ITEMS = 100
+MAX_BATCH_BYTES = 3_500_000
+
+# Backoff bounds for rate-limited requests (seconds)
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+# Concurrency and quota settings
+MAX_WORKERS = 8
+MAX_REQUESTS_PER_MINUTE = 1500
+
+# Truncated (Matryoshka) output size; must match the query-side embeddings
+_EMBED_CONFIG = types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIM)
+
+
+def _parse_retry_after(error: Exception):
+    """Extract the server-suggested retry delay (seconds) from a Gemini error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        retry_after = headers.get("Retry-After") or headers.get("retry-after")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            pass
+    # google.rpc.RetryInfo, e.g. {"@type": ".../google.rpc.RetryInfo", "retryDelay": "27s"}
+    match = _RETRY_DELAY_RE.search(str(getattr(error, "details", None) or error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class EmbeddingRateLimitError(RuntimeError):
+    """The API quota stayed exhausted through all retries (worth retrying later)."""
+
+
+class _TextEmbeddingFailed(Exception):
+    """A single text could not be embedded; offset is its index in the failed batch."""
+
+    def __init__(self, offset: int):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class _RateLimiter:
+    """Sliding-window limiter shared by all embedding worker threads."""
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request slot is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait = self.period - (now - self._calls[0])
+            time.sleep(wait)
+
+
+_rate_limiter = _RateLimiter(MAX_REQUESTS_PER_MINUTE)
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of embedding vectors keyed by a 64-bit xxh3 hash of the text.
+    Vectors are unit length, so they are stored as float16 (half the size,
+    ~1e-3 relative error, no measurable effect on retrieval ranking).
+    """
+
+    # Stay below SQLite's bound-parameter limit for IN (...) lookups
+    _LOOKUP_CHUNK = 500
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, model: str = f"{EMBEDDING_MODEL}@{EMBEDDING_DIM}:f16"):
+        self.db_path = db_path
+        self.model = model
+        self._init_db()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Get database connection."""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self) -> None:
+        """Initialize cache table."""
+        conn = self._get_conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                hash INTEGER PRIMARY KEY,
+                model TEXT,
+                vec BLOB
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def hash_text(text: str) -> int:
+        """Content hash used as cache key, as a signed 64-bit SQLite integer."""
+        key = xxhash.xxh3_64_intdigest(text.encode("utf-8"))
+        return key - (1 << 64) if key >= (1 << 63) else key
+
+    def get_many(self, hashes: list[int]) -> dict[int, list[float]]:
+        """Look up cached vectors for the given hashes."""
+        found = {}
+        conn = self._get_conn()
+        for i in range(0, len(hashes), self._LOOKUP_CHUNK):
+            chunk = hashes[i:i + self._LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                (self.model, *chunk),
+            ).fetchall()
+            for key, vec in rows:
+                found[key] = np.frombuffer(vec, dtype=np.float16).astype(np.float32).tolist()
+        conn.close()
+        return found
+
+    def set_many(self, items: list[tuple[int, list[float]]]) -> None:
+        """Store vectors for the given hashes."""
+        if not items:
+            return
+        conn = self._get_conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (hash, model, vec) VALUES (?, ?, ?)",
+            [(key, self.model, np.asarray(vec, dtype=np.float16).tobytes()) for key, vec in items],
+        )
+        conn.commit()
+        conn.close()
+
 
 class GeminiEmbeddingFunction(EmbeddingFunction):
-    """Embedding function with retry logic for rate limits."""
+    """Embedding function with batching and retry logic for rate limits."""
     document_mode = True
 
     def __init__(self):
-        pass
+        self.cache = EmbeddingCache()
 
     def __call__(self, input: list[str]) -> list[list[float]]:
+        hashes = [EmbeddingCache.hash_text(text) for text in input]
+        cached = self.cache.get_many(list(set(hashes)))
+
+        # Embed each distinct uncached text once, remembering its input position
+        missing = {}
+        for i, (key, text) in enumerate(zip(hashes, input)):
+            if key not in cached and key not in missing:
+                missing[key] = (i, text)
+
+        if missing:
+            positions, texts = zip(*missing.values())
+            new_embeddings = self._embed_texts(list(texts), list(positions))
+            new_items = list(zip(missing.keys(), new_embeddings))
+            self.cache.set_many(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in hashes]
+
+    def _embed_texts(self, input: list[str], positions: list[int]) -> list[list[float]]:
+        """
+        Embed texts through the API, batched and in parallel.
+        positions gives each text's index in the caller's input, for error reporting.
+        """
+        batches = self._split_batches(input)
         embeddings = []
-        for text in input:
-            embedding = self._embed_with_retry(text)
-            embeddings.append(embedding)
+        try:
+            if len(batches) == 1:
+                embeddings.extend(self._embed_with_retry(batches[0]))
+                return embeddings
 
-        if any(e is None for e in embeddings):
-            raise RuntimeError("Some embeddings failed. Please retry.")
+            # Results are consumed inside the pool, so the first failure cancels batches not yet started
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as executor:
+                futures = [executor.submit(self._embed_with_retry, batch) for batch in batches]
+                try:
+                    for future in futures:
+                        embeddings.extend(future.result())
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        except _TextEmbeddingFailed as e:
+            # Batches before the failed one are complete, so it starts at len(embeddings)
+            failed = positions[len(embeddings) + e.offset]
+            raise RuntimeError(f"Embedding failed at index {failed}. Please retry.") from None
         return embeddings
 
-    def _embed_with_retry(self, text: str, max_retries: int = 5):
-        """Embed a single text with exponential backoff on rate limits."""
+    @staticmethod
+    def _split_batches(input: list[str]) -> list[list[str]]:
+        """Split texts into batches that respect the API item and size limits."""
+        batches = []
+        batch, batch_bytes = [], 0
+        for text in input:
+            text_bytes = len(text.encode("utf-8"))
+            if batch and (len(batch) >= MAX_BATCH_ITEMS or batch_bytes + text_bytes >= MAX_BATCH_BYTES):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(text)
+            batch_bytes += text_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_with_retry(self, batch: list[str], max_retries: int = 5):
+        """
+        Embed a batch of texts with jittered backoff on rate limits.
+        On other errors the batch is split in half to isolate the failing text.
+        
+        Raises:
+            EmbeddingRateLimitError: If still rate limited after max_retries
+            _TextEmbeddingFailed: With the offset of the first text that failed
+        """
+        prev_wait = BACKOFF_BASE
         for attempt in range(max_retries):
             try:
+                _rate_limiter.acquire()
                 response = _client.models.embed_content(
                     model=EMBEDDING_MODEL,
-                    contents=text,
+                    contents=batch,
+                    config=_EMBED_CONFIG,
                 )
-                return response.embeddings[0].values
+                # Truncated embeddings are not unit length, normalize them
+                vectors = np.asarray([e.values for e in response.embeddings], dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                return (vectors / np.where(norms == 0, 1.0, norms)).tolist()
             except Exception as e:
                 err = str(e)
                 if "429" in err or "RESOURCE_EXHAUSTED" in err:
-                    wait = 30 * (attempt + 1)
-                    print(f"Rate limited, waiting {wait}s (attempt {attempt + 1}/{max_retries})...")
+                    # Honour Retry-After, else decorrelated jitter to avoid synchronized retries
+                    wait = _parse_retry_after(e) or min(BACKOFF_CAP, random.uniform(BACKOFF_BASE, prev_wait * 3))
+                    prev_wait = wait
+                    print(f"Rate limited, waiting {wait:.1f}s (attempt {attempt + 1}/{max_retries})...")
                     time.sleep(wait)
+                elif len(batch) > 1:
+                    mid = len(batch) // 2
+                    left = self._embed_with_retry(batch[:mid], max_retries)
+                    try:
+                        right = self._embed_with_retry(batch[mid:], max_retries)
+                    except _TextEmbeddingFailed as failure:
+                        raise _TextEmbeddingFailed(mid + failure.offset) from None
+                    return left + right
                 else:
                     print(f"Embedding error: {e}")
-                    return None
-        print(f"Failed after {max_retries} retries.")
-        return None
+                    raise _TextEmbeddingFailed(0) from None
+        raise EmbeddingRateLimitError(f"Rate limited after {max_retries} retries.")
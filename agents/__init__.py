@@ -1,8 +1,5 @@
 """Agents module for the University AI Assistant."""
-from .orchestrator import AgentOrchestrator
-from .qa_agent import QAAgent
-from .admin_agent import AdminAgent
-from .email_agent import EmailAgent
+from importlib import import_module
 
 __all__ = [
     "AgentOrchestrator",
@@ -10,3 +7,25 @@ __all__ = [
     "AdminAgent",
     "EmailAgent",
 ]
+
+# Submodules are imported on first attribute access, so importing one agent
+# does not pull in chromadb / google-genai for all the others.
+_LAZY_IMPORTS = {
+    "AgentOrchestrator": ".orchestrator",
+    "QAAgent": ".qa_agent",
+    "AdminAgent": ".admin_agent",
+    "EmailAgent": ".email_agent",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -2,11 +2,80 @@
 Admin Agent Module
 Handles administrative queries and database operations with function calling.
 """
+import hashlib
+import json
+import queue
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import groupby
+from pathlib import Path
 from typing import Dict, Any, List, Optional
 from core.llm import get_llm_client
 from config import SQLITE_DB_PATH
 
+try:
+    import orjson
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj, default=str).decode()
+except ImportError:
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":"))
+
+# Maximum rows and characters per value shown to the LLM
+PREVIEW_ROWS = 10
+PREVIEW_VALUE_CHARS = 200
+
+# Table holding generated SQL, hidden from the schema shown to the LLM
+SQL_CACHE_TABLE = "admin_sql_cache"
+SQL_CACHE_SIZE = 512
+
+
+class ReadPool:
+    """
+    Pool of read-only SQLite connections for concurrent SELECT queries.
+    WAL mode lets these readers run in parallel with the single writer.
+    """
+    
+    def __init__(self, db_path: str, size: int = 4):
+        """
+        Initialize the pool.
+        
+        Args:
+            db_path: Path to SQLite database
+            size: Number of read-only connections
+        """
+        self._pool = queue.Queue(maxsize=size)
+        # as_uri() percent-encodes "?", "#" and "%" in the path
+        uri = Path(db_path).absolute().as_uri() + "?mode=ro"
+        for _ in range(size):
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                check_same_thread=False
+            )
+            conn.executescript("""
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-64000;
+                PRAGMA busy_timeout=5000;
+            """)
+            self._pool.put(conn)
+    
+    @contextmanager
+    def acquire(self):
+        """Borrow a connection, returning it to the pool afterwards."""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+    
+    def close(self) -> None:
+        """Close all pooled connections."""
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
 
 class AdminAgent:
     """
@@ -22,10 +91,47 @@ class AdminAgent:
         """
         self.llm = get_llm_client()
         self.db_path = db_path
+        self._schema_cache = None
+        self._schema_version = -1
+        self._schema_hash = ""
+        self._sql_system_prompt = None
+        self._sql_prompt_schema = None
+        
+        # (normalized query, schema hash) -> SQL, most recently used last
+        self._sql_cache: OrderedDict = OrderedDict()
+        # The agent is shared by session threads; OrderedDict reordering is not thread-safe
+        self._sql_cache_lock = threading.Lock()
         
-    def _get_conn(self) -> sqlite3.Connection:
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
+        # Single long-lived connection shared across threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-64000;
+            PRAGMA busy_timeout=5000;
+        """)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SQL_CACHE_TABLE} (
+                query_key TEXT NOT NULL,
+                schema_hash TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                PRIMARY KEY (query_key, schema_hash)
+            )
+        """)
+        # Read-only connections for SELECTs (opened after the writer creates the file)
+        self._pool = ReadPool(db_path)
+    
+    def close(self) -> None:
+        """Close all database connections."""
+        self._pool.close()
+        with self._lock:
+            self._conn.close()
     
     def query(self, user_query: str) -> Dict[str, Any]:
         """
@@ -40,8 +146,13 @@ class AdminAgent:
         # Get database schema
         schema = self._get_schema()
         
-        # Generate SQL query
-        sql = self._generate_sql(user_query, schema)
+        # Reuse SQL generated for the same question, else ask the LLM
+        query_key = self._normalize_query(user_query)
+        sql = self._get_cached_sql(query_key)
+        if sql is None:
+            sql = self._generate_sql(user_query, schema)
+            if sql:
+                self._store_sql(query_key, sql)
         
         if not sql:
             return {
@@ -69,42 +180,104 @@ class AdminAgent:
             }
     
     def _get_schema(self) -> str:
-        """Get database schema as string."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        # Get all tables
-        c.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = c.fetchall()
+        """Get database schema as string, cached until the schema changes."""
+        with self._lock:
+            # schema_version is bumped by SQLite on every DDL change
+            version = self._conn.execute("PRAGMA schema_version;").fetchone()[0]
+            if self._schema_cache is not None and version == self._schema_version:
+                return self._schema_cache
+            
+            # Get all tables and their columns in one statement
+            rows = self._conn.execute("""
+                SELECT m.name AS tbl, p.name AS col, p.type
+                FROM sqlite_master m
+                JOIN pragma_table_info(m.name) p
+                WHERE m.type = 'table' AND m.name != ?
+                ORDER BY m.name, p.cid;
+            """, (SQL_CACHE_TABLE,)).fetchall()
         
         schema_parts = []
-        for (table_name,) in tables:
-            c.execute(f"PRAGMA table_info({table_name});")
-            columns = c.fetchall()
-            cols = [f"{col[1]} ({col[2]})" for col in columns]
+        for table_name, columns in groupby(rows, key=lambda row: row[0]):
+            cols = [f"{col} ({col_type})" for _, col, col_type in columns]
             schema_parts.append(f"Table: {table_name}\nColumns: {', '.join(cols)}")
         
-        conn.close()
-        return "\n\n".join(schema_parts)
+        self._schema_cache = "\n\n".join(schema_parts)
+        self._schema_version = version
+        self._schema_hash = hashlib.md5(self._schema_cache.encode()).hexdigest()
+        return self._schema_cache
     
-    def _generate_sql(self, user_query: str, schema: str) -> Optional[str]:
-        """Generate SQL from natural language query."""
-        prompt = f"""You are a SQL expert. Convert the following natural language query to SQL.
+    @staticmethod
+    def _normalize_query(user_query: str) -> str:
+        """
+        Normalize a query so rephrasings differing only in case/whitespace share SQL.
+        Punctuation is kept: "GPA > 3.5" and "GPA < 35" need different SQL.
+        """
+        return " ".join(user_query.lower().split())
+    
+    def _get_cached_sql(self, query_key: str) -> Optional[str]:
+        """Look up previously generated SQL for the current schema."""
+        key = (query_key, self._schema_hash)
+        with self._sql_cache_lock:
+            sql = self._sql_cache.get(key)
+            if sql is not None:
+                self._sql_cache.move_to_end(key)
+                return sql
+        
+        with self._lock:
+            row = self._conn.execute(f"""
+                SELECT sql FROM {SQL_CACHE_TABLE}
+                WHERE query_key = ? AND schema_hash = ?
+            """, key).fetchone()
+        if row is None:
+            return None
+        
+        self._remember_sql(key, row[0])
+        return row[0]
+    
+    def _store_sql(self, query_key: str, sql: str) -> None:
+        """Remember generated SQL in memory and in the database."""
+        key = (query_key, self._schema_hash)
+        self._remember_sql(key, sql)
+        with self._lock:
+            self._conn.execute(f"""
+                INSERT OR REPLACE INTO {SQL_CACHE_TABLE} (query_key, schema_hash, sql)
+                VALUES (?, ?, ?)
+            """, (*key, sql))
+    
+    def _remember_sql(self, key: tuple, sql: str) -> None:
+        """Add SQL to the in-memory LRU cache."""
+        with self._sql_cache_lock:
+            self._sql_cache[key] = sql
+            self._sql_cache.move_to_end(key)
+            if len(self._sql_cache) > SQL_CACHE_SIZE:
+                self._sql_cache.popitem(last=False)
+    
+    def _build_sql_system_prompt(self, schema: str) -> str:
+        """Build the static schema + rules instruction for SQL generation."""
+        return f"""You are a SQL expert. Convert the user's natural language query to SQL.
 
 Database Schema:
 {schema}
 
-User Query: "{user_query}"
-
 Rules:
 - Only generate SELECT queries (no INSERT, UPDATE, DELETE)
 - Use proper SQL syntax for SQLite
 - Return ONLY the SQL query, nothing else
-- If the query cannot be answered with the schema, return "INVALID"
-
-SQL Query:"""
-
-        response = self.llm.generate(prompt, temperature=0.1)
+- If the query cannot be answered with the schema, return "INVALID".
+"""
+    
+    def _generate_sql(self, user_query: str, schema: str) -> Optional[str]:
+        """Generate SQL from natural language query."""
+        # The schema part of the prompt only changes with the schema
+        if self._sql_system_prompt is None or self._sql_prompt_schema != schema:
+            self._sql_system_prompt = self._build_sql_system_prompt(schema)
+            self._sql_prompt_schema = schema
+        
+        response = self.llm.generate(
+            f'User Query: "{user_query}"\n\nSQL Query:',
+            system_instruction=self._sql_system_prompt,
+            temperature=0.1
+        )
         sql = response.strip()
         
         # Clean up response
@@ -117,17 +290,13 @@ SQL Query:"""
     
     def _execute_query(self, sql: str) -> List[Dict[str, Any]]:
         """Execute a SQL query and return results."""
-        conn = self._get_conn()
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        
-        c.execute(sql)
-        rows = c.fetchall()
-        
-        results = [dict(row) for row in rows]
-        conn.close()
+        # _generate_sql only lets SELECT through, so the read pool is safe here
+        with self._pool.acquire() as conn:
+            cur = conn.execute(sql)
+            cols = [d[0] for d in cur.description]
+            rows = cur.fetchall()
         
-        return results
+        return [dict(zip(cols, row)) for row in rows]
     
     def _format_response(
         self,
@@ -139,14 +308,22 @@ SQL Query:"""
         if not results:
             return "No results found matching your query."
         
-        # Summarize results for the LLM
-        results_preview = str(results[:10])  # Limit for prompt size
+        # Summarize results for the LLM: column names once, then bounded row values
+        columns = list(results[0].keys())
+        rows = [
+            [
+                v[:PREVIEW_VALUE_CHARS] if isinstance(v, str) else v
+                for v in row.values()
+            ]
+            for row in results[:PREVIEW_ROWS]
+        ]
+        results_preview = _json_dumps({"columns": columns, "rows": rows})
         
         prompt = f"""Convert these database results into a natural, helpful response.
 
 User asked: "{user_query}"
 
-Results (showing up to 10 of {len(results)} total):
+Results (showing up to {PREVIEW_ROWS} of {len(results)} total):
 {results_preview}
 
 Provide a clear, natural language summary of the data. Include specific numbers and names where relevant.
@@ -158,43 +335,29 @@ Keep the response concise but informative."""
     
     def get_user_count(self) -> int:
         """Get total number of registered users."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM users")
-        count = c.fetchone()[0]
-        conn.close()
-        return count
+        with self._pool.acquire() as conn:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
     
     def get_users_by_role(self) -> Dict[str, int]:
         """Get user count by role."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT role, COUNT(*) as count
-            FROM users
-            GROUP BY role
-        """)
-        
-        rows = c.fetchall()
-        conn.close()
+        with self._pool.acquire() as conn:
+            rows = conn.execute("""
+                SELECT role, COUNT(*) as count
+                FROM users
+                GROUP BY role
+            """).fetchall()
         
         return {row[0]: row[1] for row in rows}
     
     def get_recent_users(self, limit: int = 10) -> List[Dict]:
         """Get recently registered users."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT username, role, created_at, last_login
-            FROM users
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,))
-        
-        rows = c.fetchall()
-        conn.close()
+        with self._pool.acquire() as conn:
+            rows = conn.execute("""
+                SELECT username, role, created_at, last_login
+                FROM users
+                ORDER BY created_at DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
         
         return [
             {
@@ -205,3 +368,17 @@ Keep the response concise but informative."""
             }
             for row in rows
         ]
+
+
+# Singleton
+_admin_agent = None
+_admin_agent_lock = threading.Lock()
+
+def get_admin_agent() -> AdminAgent:
+    """Get or create AdminAgent singleton."""
+    global _admin_agent
+    if _admin_agent is None:
+        with _admin_agent_lock:
+            if _admin_agent is None:
+                _admin_agent = AdminAgent()
+    return _admin_agent
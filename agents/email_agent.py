@@ -7,6 +7,20 @@ import json
 import re
 from typing import Dict, Any, Optional
 from core.llm import get_llm_client
+from core.resources import shared_resource
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Control characters stripped from user input (keeps \t, \n and \r)
+_CTRL_TABLE = dict.fromkeys(list(range(0, 9)) + [11, 12] + list(range(14, 32)))
+
+# Markdown code fences around the LLM's JSON output
+_FENCE_OPEN = re.compile(r'^```(?:json)?\s*')
+_FENCE_CLOSE = re.compile(r'\s*```$')
 
 
 # Supported email types with required/optional fields
@@ -178,11 +192,12 @@ RÉPONDS UNIQUEMENT au format JSON suivant (sans markdown, sans ```):
             # Try to extract JSON from the response
             # Remove markdown code blocks if present
             cleaned = response.strip()
-            cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
-            cleaned = re.sub(r'\s*```$', '', cleaned)
+            cleaned = _FENCE_OPEN.sub('', cleaned)
+            cleaned = _FENCE_CLOSE.sub('', cleaned)
             cleaned = cleaned.strip()
 
-            result = json.loads(cleaned)
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError
+            result = _json_loads(cleaned)
 
             if "email_subject" in result and "email_body" in result:
                 return {
@@ -203,21 +218,15 @@ RÉPONDS UNIQUEMENT au format JSON suivant (sans markdown, sans ```):
         """Sanitize user input to prevent prompt injection."""
         if not value:
             return ""
-        # Remove potential prompt injection patterns
-        sanitized = value.strip()
-        # Limit length
-        sanitized = sanitized[:500]
-        # Remove control characters
-        sanitized = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', sanitized)
-        return sanitized
+        # Strip, limit length and remove control characters
+        return value.strip()[:500].translate(_CTRL_TABLE)
 
 
-# Singleton
-_email_agent = None
+# Shared instance, created once per process (survives Streamlit reruns)
+@shared_resource
+def _shared_email_agent() -> EmailAgent:
+    return EmailAgent()
 
 def get_email_agent() -> EmailAgent:
     """Get or create EmailAgent singleton."""
-    global _email_agent
-    if _email_agent is None:
-        _email_agent = EmailAgent()
-    return _email_agent
+    return _shared_email_agent()
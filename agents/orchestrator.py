@@ -2,10 +2,12 @@
 Agent Orchestrator Module
 Routes queries to appropriate specialized agents based on intent classification.
 """
+import asyncio
 import re
-from typing import Dict, Any, Optional, List
-from core.llm import get_llm_client
+from typing import Dict, Any, Iterator, Optional, List, Tuple
+from core.llm import get_llm_client, cached_classify_intent, cached_rewrite_query
 from core.memory import get_session_memory, get_conversation_memory
+from config import QUERY_REWRITE
 
 # Common greetings / small talk patterns (case-insensitive)
 _GREETING_PATTERNS = re.compile(
@@ -15,6 +17,21 @@ _GREETING_PATTERNS = re.compile(
     re.IGNORECASE
 )
 
+# Single-word greetings, checked with a set lookup before falling back to the regex
+_GREETINGS = frozenset({
+    "hi", "hello", "hey", "bonjour", "salut", "salam", "bonsoir", "yo",
+    "thanks", "merci", "bye", "goodbye", "help", "aidez"
+})
+
+
+def _is_greeting(query: str) -> bool:
+    """Check whether a query is only a greeting / small talk."""
+    words = query.split()
+    if len(words) == 1 and words[0].rstrip('!?.').lower() in _GREETINGS:
+        return True
+    # Multi-word patterns ("good morning", "how are you", ...)
+    return bool(_GREETING_PATTERNS.match(query))
+
 
 class AgentOrchestrator:
     """
@@ -34,26 +51,20 @@ class AgentOrchestrator:
         self.llm = get_llm_client()
         self.session_memory = get_session_memory()
         self.conversation_memory = get_conversation_memory()
-        
-        # Lazy-loaded agents
-        self._qa_agent = None
-        self._admin_agent = None
+        # Result of the last process_query_stream() call, set once the stream is consumed
+        self.last_result: Dict[str, Any] = {}
         
     @property
     def qa_agent(self):
-        """Lazy load Q&A agent."""
-        if self._qa_agent is None:
-            from .qa_agent import QAAgent
-            self._qa_agent = QAAgent()
-        return self._qa_agent
+        """Lazy load the shared Q&A agent."""
+        from .qa_agent import get_qa_agent
+        return get_qa_agent()
     
     @property
     def admin_agent(self):
-        """Lazy load Admin agent."""
-        if self._admin_agent is None:
-            from .admin_agent import AdminAgent
-            self._admin_agent = AdminAgent()
-        return self._admin_agent
+        """Lazy load the shared Admin agent."""
+        from .admin_agent import get_admin_agent
+        return get_admin_agent()
     
     def process_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -66,21 +77,76 @@ class AgentOrchestrator:
         Returns:
             Response dict with answer, intent, and metadata
         """
+        history, intent, context = self._prepare_query(query, context)
+        
+        # Route to appropriate agent
+        response = self._route_to_agent(query, intent, history, context)
+        if response is None:
+            response = {}
+        
+        return self._finish_query(query, intent, response)
+    
+    def process_query_stream(self, query: str, context: Dict[str, Any] = None) -> Iterator[str]:
+        """
+        Process a user query, yielding the answer as it is generated.
+        Once the stream is consumed, the full response dict is in last_result.
+        
+        Args:
+            query: User's query
+            context: Optional additional context
+            
+        Yields:
+            Text chunks of the answer
+        """
+        self.last_result = {}
+        history, intent, context = self._prepare_query(query, context)
+        
+        response = self._route_to_agent(query, intent, history, context, stream=True)
+        if response is None:
+            response = {}
+        
+        answer = response.get("answer", "")
+        parts = []
+        for chunk in ([answer] if isinstance(answer, str) else answer):
+            parts.append(chunk)
+            yield chunk
+        response["answer"] = "".join(parts)
+        
+        self.last_result = self._finish_query(query, intent, response)
+    
+    def _prepare_query(
+        self,
+        query: str,
+        context: Dict[str, Any] = None
+    ) -> Tuple[List[Dict], str, Dict[str, Any]]:
+        """
+        Load history, classify intent and build the routing context.
+        
+        Returns:
+            (history, intent, context)
+        """
         # Get conversation history
         history = self.session_memory.get_history(self.session_id)
         
         # Classify intent
         # Fast-path: detect obvious greetings without burning an LLM call
-        if _GREETING_PATTERNS.match(query):
+        retrieval_query = None
+        if _is_greeting(query):
             intent = "general"
+        elif QUERY_REWRITE:
+            # Classification and rewrite are independent LLM calls, run them concurrently
+            intent, retrieval_query = asyncio.run(self._aclassify_and_rewrite(query, history))
         else:
-            intent = self.llm.classify_intent(query)
+            intent = cached_classify_intent(query)
         
-        # Route to appropriate agent
-        response = self._route_to_agent(query, intent, history, context)
-        if response is None:
-            response = {}
+        context = dict(context or {})
+        if retrieval_query:
+            context["retrieval_query"] = retrieval_query
         
+        return history, intent, context
+    
+    def _finish_query(self, query: str, intent: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a completed turn in memory and build the response dict."""
         # Store in memory
         self.session_memory.add_turn(
             self.session_id,
@@ -105,12 +171,38 @@ class AgentOrchestrator:
             "metadata": response.get("metadata", {})
         }
     
+    async def _aclassify_and_rewrite(
+        self,
+        query: str,
+        history: List[Dict]
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Classify intent and rewrite the query for retrieval concurrently.
+        
+        Returns:
+            (intent, rewritten query or None when retrieval is not needed)
+        """
+        intent = self.llm.fast_intent(query)
+        if intent and intent != "qa":
+            return intent, None
+        
+        # Rewrites that depend on the conversation are not cacheable
+        if history:
+            rewrite = self.llm.arewrite_query(query, history)
+        else:
+            rewrite = asyncio.to_thread(cached_rewrite_query, query)
+        return tuple(await asyncio.gather(
+            asyncio.to_thread(cached_classify_intent, query),
+            rewrite
+        ))
+    
     def _route_to_agent(
         self,
         query: str,
         intent: str,
         history: List[Dict],
-        context: Dict[str, Any] = None
+        context: Dict[str, Any] = None,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         Route query to the appropriate agent based on intent.
@@ -120,6 +212,7 @@ class AgentOrchestrator:
             intent: Classified intent
             history: Conversation history
             context: Additional context
+            stream: Let agents that support it return the answer as an iterator
             
         Returns:
             Agent response
@@ -130,7 +223,9 @@ class AgentOrchestrator:
             return self.qa_agent.answer(
                 query=query,
                 conversation_history=history,
-                document_filter=context.get("document_filter")
+                document_filter=context.get("document_filter"),
+                retrieval_query=context.get("retrieval_query"),
+                stream=stream
             )
             
         elif intent == "admin":
@@ -142,12 +237,13 @@ class AgentOrchestrator:
             return self.admin_agent.query(query)
             
         else:  # general or unknown
-            return self._handle_general_query(query, history)
+            return self._handle_general_query(query, history, stream=stream)
     
     def _handle_general_query(
         self,
         query: str,
-        history: List[Dict]
+        history: List[Dict],
+        stream: bool = False
     ) -> Dict[str, Any]:
         """Handle general queries with a friendly response."""
         # For greetings / small talk, respond directly without RAG
@@ -161,7 +257,8 @@ If this is off-topic, politely redirect to university topics you can help with.
 
 Keep your response brief, friendly and helpful. Respond in the same language the user used."""
 
-        answer = self.llm.generate(prompt, temperature=0.7)
+        generate = self.llm.generate_stream if stream else self.llm.generate
+        answer = generate(prompt, temperature=0.7)
         return {
             "answer": answer,
             "sources": [],
@@ -2,10 +2,61 @@
 Q&A Agent Module
 Handles question-answering with RAG retrieval from university documents.
 """
+import asyncio
+import threading
 from typing import Dict, Any, List, Optional
+import numpy as np
 from core.llm import get_llm_client
-from core.vector_store import get_vector_store
-from config import TOP_K_RESULTS
+from core.vector_store import get_vector_store, RETRIEVAL_INCLUDE
+from config import TOP_K_RESULTS, USE_MMR, MMR_FETCH_K, MMR_LAMBDA
+
+
+def _mmr(
+    doc_embs: np.ndarray,
+    dists: np.ndarray,
+    k: int,
+    lam: float = MMR_LAMBDA
+) -> np.ndarray:
+    """
+    Maximal Marginal Relevance selection over retrieved candidates.
+    
+    Args:
+        doc_embs: Candidate embeddings, shape (n, dim)
+        dists: Candidate distances to the query, shape (n,)
+        k: Number of candidates to select
+        lam: Trade-off between relevance (1.0) and diversity (0.0)
+        
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    n = len(dists)
+    k = min(k, n)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    
+    # Relevance in [0, 1], higher is closer to the query
+    span = dists.max() - dists.min()
+    relevance = 1.0 - (dists - dists.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+    
+    # Cosine similarity between candidates
+    norms = np.linalg.norm(doc_embs, axis=1, keepdims=True)
+    unit = doc_embs / np.where(norms == 0, 1.0, norms)
+    sim_matrix = unit @ unit.T
+    
+    selected = [int(np.argmax(relevance))]
+    max_sim = sim_matrix[selected[0]].copy()
+    chosen = np.zeros(n, dtype=bool)
+    chosen[selected[0]] = True
+    
+    for _ in range(k - 1):
+        scores = lam * relevance - (1.0 - lam) * max_sim
+        scores[chosen] = -np.inf
+        j = int(np.argmax(scores))
+        selected.append(j)
+        chosen[j] = True
+        np.maximum(max_sim, sim_matrix[j], out=max_sim)
+    
+    return np.asarray(selected, dtype=np.intp)
 
 
 class QAAgent:
@@ -47,7 +98,9 @@ Guidelines:
         self,
         query: str,
         conversation_history: List[Dict] = None,
-        document_filter: Dict[str, Any] = None
+        document_filter: Dict[str, Any] = None,
+        retrieval_query: str = None,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         Answer a question using RAG retrieval.
@@ -56,23 +109,46 @@ Guidelines:
             query: User's question
             conversation_history: Previous conversation turns
             document_filter: Metadata filters for retrieval
+            retrieval_query: Optional rewritten query used for the search only
+            stream: Return the answer as an iterator of text chunks
             
         Returns:
             Response with answer, sources, and context chunks
         """
         try:
-            # Retrieve relevant passages (skip query rewrite to save API quota)
-            if document_filter and isinstance(document_filter, dict):
+            # Retrieve relevant passages (query rewrite is opt-in to save API quota)
+            search_query = retrieval_query or query
+            # With MMR, over-fetch candidates with their embeddings and rerank
+            n_results = max(MMR_FETCH_K, TOP_K_RESULTS) if USE_MMR else TOP_K_RESULTS
+            include = RETRIEVAL_INCLUDE + ["embeddings"] if USE_MMR else RETRIEVAL_INCLUDE
+            
+            if retrieval_query and retrieval_query != query:
+                # Search with both phrasings concurrently and fuse the rankings
+                where = None
+                if document_filter and isinstance(document_filter, dict):
+                    where = self.vector_store.build_filter(
+                        document_filter.get("document_type"),
+                        document_filter.get("source_file")
+                    )
+                results = asyncio.run(self.vector_store.aquery(
+                    [query, retrieval_query],
+                    n_results=n_results,
+                    where=where,
+                    include=include
+                ))
+            elif document_filter and isinstance(document_filter, dict):
                 results = self.vector_store.query_with_filter(
-                    query_text=query,
+                    query_text=search_query,
                     document_type=document_filter.get("document_type"),
                     source_file=document_filter.get("source_file"),
-                    n_results=TOP_K_RESULTS
+                    n_results=n_results,
+                    include=include
                 )
             else:
                 results = self.vector_store.query(
-                    query_text=query,
-                    n_results=TOP_K_RESULTS
+                    query_text=search_query,
+                    n_results=n_results,
+                    include=include
                 )
             
             if not results or not isinstance(results, dict):
@@ -80,11 +156,21 @@ Guidelines:
             
             passages = results.get("documents") or []
             metadatas = results.get("metadatas") or []
-            distances = results.get("distances") or []
+            distances = results.get("distances")
+            dists = np.asarray(distances if distances is not None else [], dtype=np.float32)
+            
+            embeddings = results.get("embeddings")
+            if USE_MMR and embeddings is not None and len(embeddings) == len(passages) == len(dists):
+                order = _mmr(np.asarray(embeddings, dtype=np.float32), dists, TOP_K_RESULTS)
+                passages = [passages[i] for i in order]
+                metadatas = [metadatas[i] for i in order] if metadatas else []
+                dists = dists[order]
+            distances = dists.tolist()
             
             # Generate response with context
             if passages:
-                answer = self.llm.generate_with_context(
+                generate = self.llm.generate_with_context_stream if stream else self.llm.generate_with_context
+                answer = generate(
                     query=query,
                     context_passages=passages,
                     conversation_history=conversation_history,
@@ -95,6 +181,8 @@ Guidelines:
                 sources = self._extract_sources(metadatas)
             else:
                 answer = self._no_context_response(query)
+                if stream:
+                    answer = iter([answer])
                 sources = []
             
             return {
@@ -117,25 +205,22 @@ Guidelines:
     
     def _extract_sources(self, metadatas) -> List[Dict]:
         """Extract source information from metadata."""
-        sources = []
-        seen_sources = set()
-        
-        if not metadatas:
-            return sources
-        
-        for meta in metadatas:
-            if not meta or not isinstance(meta, dict):
-                continue
+        # First metadata seen per source, in retrieval order
+        seen: Dict[str, Dict] = {}
+        for meta in metadatas or ():
+            meta = meta or {}
             source = meta.get("source", "Unknown")
-            if source not in seen_sources:
-                seen_sources.add(source)
-                sources.append({
-                    "file": source,
-                    "document_type": meta.get("document_type", "general"),
-                    "page": meta.get("page")
-                })
-                
-        return sources
+            if source not in seen:
+                seen[source] = meta
+        
+        return [
+            {
+                "file": source,
+                "document_type": meta.get("document_type", "general"),
+                "page": meta.get("page")
+            }
+            for source, meta in seen.items()
+        ]
     
     def _no_context_response(self, query: str) -> str:
         """Generate response when no relevant context is found."""
@@ -191,6 +276,22 @@ Is there something else I can help you with?"""
         return result["answer"]
 
 
+# Singletons, one per collection
+_qa_agents: Dict[str, QAAgent] = {}
+_qa_agents_lock = threading.Lock()
+
+def get_qa_agent(collection_name: str = "university") -> QAAgent:
+    """Get or create the QAAgent singleton for a collection."""
+    agent = _qa_agents.get(collection_name)
+    if agent is None:
+        with _qa_agents_lock:
+            agent = _qa_agents.get(collection_name)
+            if agent is None:
+                agent = QAAgent(collection_name)
+                _qa_agents[collection_name] = agent
+    return agent
+
+
 # Convenience function
 def ask_university(query: str) -> str:
     """
@@ -202,5 +303,5 @@ def ask_university(query: str) -> str:
     Returns:
         Answer string
     """
-    agent = QAAgent()
+    agent = get_qa_agent()
     return agent.quick_answer(query)
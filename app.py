@@ -4,15 +4,24 @@ Main Streamlit Application - Q&A System
 """
 import streamlit as st
 import uuid
+from config import MAX_CONVERSATION_HISTORY
 
-# Import components
-from agents.orchestrator import create_orchestrator
+# Only the lightweight auth dependency is imported up front; the agents and
+# caches (google-genai, chromadb) are imported once the user is logged in.
 from database.operations import get_db_operations
-from database.faq_cache import get_faq_cache
 
 # Initialize database
 db_ops = get_db_operations()
 
+# Messages kept in the chat window (user + assistant per turn)
+MAX_CHAT_MESSAGES = 2 * MAX_CONVERSATION_HISTORY
+
+@st.cache_resource(show_spinner=False)
+def warm_up_faq_cache() -> int:
+    """Preload the seeded FAQ answers into the semantic cache, once per process."""
+    from database.semantic_cache import get_semantic_cache
+    return get_semantic_cache().warm_up()
+
 # ========== PAGE CONFIG ==========
 st.set_page_config(
     page_title="University AI Assistant",
@@ -38,6 +47,7 @@ if "orchestrator" not in st.session_state:
 def login(username: str, password: str) -> bool:
     user = db_ops.authenticate_user(username, password)
     if user:
+        from agents.orchestrator import create_orchestrator
         st.session_state.user = user
         st.session_state.orchestrator = create_orchestrator(
             session_id=st.session_state.session_id,
@@ -95,6 +105,7 @@ if not st.session_state.user:
     st.stop()
 
 # ========== MAIN APP (LOGGED IN) ==========
+warm_up_faq_cache()
 
 # Sidebar
 with st.sidebar:
@@ -119,11 +130,8 @@ with st.sidebar:
 st.title("🎓 University AI Assistant")
 st.markdown("Ask me anything about university policies, procedures, courses, and more!")
 
-# FAQ Cache for common questions
-faq_cache = get_faq_cache()
-
 # Display chat history
-for msg in st.session_state.chat_history:
+for msg in st.session_state.chat_history[-MAX_CHAT_MESSAGES:]:
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
         if msg.get("sources"):
@@ -140,42 +148,59 @@ if user_question:
     with st.chat_message("user"):
         st.write(user_question)
     
-    # Check cache first
+    # FAQ Caches for common questions: exact match, then paraphrase match
+    from database.faq_cache import get_faq_cache
+    from database.semantic_cache import get_semantic_cache
+    faq_cache = get_faq_cache()
+    semantic_cache = get_semantic_cache()
+    
+    # Check caches first
     cached_response = faq_cache.get(user_question)
+    query_embedding = None
+    if not cached_response:
+        try:
+            query_embedding = semantic_cache.embed(user_question)
+            cached_response = semantic_cache.get(query_embedding)
+        except Exception as e:
+            print(f"[SemanticCache Error] {e}")
     
-    if cached_response:
-        response_text = cached_response
-        sources = []
-    else:
-        # Get orchestrator response
-        with st.spinner("Searching university documents..."):
+    # Display assistant response
+    with st.chat_message("assistant"):
+        if cached_response:
+            response_text = cached_response
+            sources = []
+            st.write(response_text)
+        else:
+            # Stream the orchestrator response as it is generated
+            # (created at login and kept in session state across reruns)
             orchestrator = st.session_state.orchestrator
-            if orchestrator is None:
-                orchestrator = create_orchestrator(
-                    session_id=st.session_state.session_id,
-                    user_id=st.session_state.user['username']
-                )
-                st.session_state.orchestrator = orchestrator
-            
-            result = orchestrator.process_query(user_question)
-            response_text = result.get("answer", "I couldn't find information about that.")
+            # Follow-ups depend on the conversation, so their answers are not shared
+            had_history = bool(orchestrator.session_memory.get_history(orchestrator.session_id))
+            with st.spinner("Searching university documents..."):
+                st.write_stream(orchestrator.process_query_stream(user_question))
+            result = orchestrator.last_result
+            response_text = result.get("answer") or "I couldn't find information about that."
             sources = result.get("sources", [])
             
             # Cache the response
             faq_cache.set(user_question, response_text)
+            # Paraphrases only reuse self-contained document answers (not admin data or the fallback)
+            if (query_embedding is not None and result.get("intent") == "qa"
+                    and not had_history and result.get("answer")):
+                semantic_cache.set(user_question, query_embedding, response_text)
+        
+        if sources:
+            with st.expander("📚 Sources"):
+                for source in sources:
+                    st.caption(f"• {source.get('file', 'Unknown')}")
     
-    # Display assistant response
     st.session_state.chat_history.append({
         "role": "assistant", 
         "content": response_text,
         "sources": sources
     })
-    with st.chat_message("assistant"):
-        st.write(response_text)
-        if sources:
-            with st.expander("📚 Sources"):
-                for source in sources:
-                    st.caption(f"• {source.get('file', 'Unknown')}")
+    # Keep a sliding window of the most recent turns
+    st.session_state.chat_history = st.session_state.chat_history[-MAX_CHAT_MESSAGES:]
     
     st.rerun()
 
@@ -10,20 +10,44 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 # Database Paths
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma_db")
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "./student_results.db")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+# Pooled connections per SQLite database file
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+# Queued writes are committed by a background thread in batches of up to
+# SQLITE_FLUSH_BATCH rows, at most SQLITE_FLUSH_INTERVAL seconds after queueing
+SQLITE_FLUSH_BATCH = int(os.getenv("SQLITE_FLUSH_BATCH", "50"))
+SQLITE_FLUSH_INTERVAL = float(os.getenv("SQLITE_FLUSH_INTERVAL", "0.1"))
 
 # Document 
 PDF_DIRECTORY = os.getenv("PDF_DIRECTORY", "./pdf")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+# Extracted PDF page text, keyed by file content hash, reused across ingest runs
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", "./.cache/pdf_text")
 
 # RAG Settings
 TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "5"))
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
 
+# MMR reranking: over-fetch candidates and pick a relevant but diverse top-k
+USE_MMR = os.getenv("USE_MMR", "false").lower() in ("1", "true", "yes")
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+
 # LLM Settings
 LLM_MODEL = os.getenv("LLM_MODEL", "models/gemini-2.5-flash")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+# Requested embedding size (Matryoshka truncation); re-ingest documents after changing it
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "768"))
+# Micro-batch concurrent query embeddings into one request
+EMBED_USE_BATCHING = os.getenv("EMBED_USE_BATCHING", "false").lower() in ("1", "true", "yes")
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "10"))
+EMBED_MAX_BATCH_HOLD = float(os.getenv("EMBED_MAX_BATCH_HOLD", "0.01"))
+# Embed bulk document indexing through the Gemini Batch API (half price, but jobs can take hours)
+EMBED_USE_BATCH_API = os.getenv("EMBED_USE_BATCH_API", "false").lower() in ("1", "true", "yes")
 MAX_CONTEXT_LENGTH = int(os.getenv("MAX_CONTEXT_LENGTH", "8000"))
+# Rewrite queries for retrieval (runs concurrently with intent classification)
+QUERY_REWRITE = os.getenv("QUERY_REWRITE", "false").lower() in ("1", "true", "yes")
 
 # Collections for different document types
 COLLECTIONS = {
@@ -39,6 +63,14 @@ DEFAULT_COLLECTION = "university"
 # Cache Settings
 FAQ_CACHE_TTL_HOURS = int(os.getenv("FAQ_CACHE_TTL_HOURS", "24"))
 MAX_CACHE_SIZE = int(os.getenv("MAX_CACHE_SIZE", "1000"))
+# Seconds between background writes of coalesced FAQ cache hit counts
+FAQ_HIT_FLUSH_INTERVAL = float(os.getenv("FAQ_HIT_FLUSH_INTERVAL", "5"))
+# Seconds between refreshes of the materialized FAQ cache statistics
+FAQ_STATS_REFRESH_INTERVAL = float(os.getenv("FAQ_STATS_REFRESH_INTERVAL", "60"))
+# Minimum cosine similarity for reusing the answer of a paraphrased question
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Optional JSON file of {"question": "answer"} pairs preloaded into the semantic cache
+FAQ_SEED_PATH = os.getenv("FAQ_SEED_PATH", "./faq_seed.json")
 
 # Conversation Settings
 MAX_CONVERSATION_HISTORY = int(os.getenv("MAX_CONVERSATION_HISTORY", "10"))
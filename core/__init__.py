@@ -1,7 +1,26 @@
-# Core modules for the University AI Assistant
-from .embeddings import GeminiEmbeddings
-from .vector_store import VectorStore
-from .llm import LLMClient
-from .memory import ConversationMemory
+"""Core modules for the University AI Assistant."""
+from importlib import import_module
 
 __all__ = ["GeminiEmbeddings", "VectorStore", "LLMClient", "ConversationMemory"]
+
+# Submodules are imported on first attribute access, so lightweight helpers
+# (e.g. core.db_pool) do not pull in chromadb / google-genai.
+_LAZY_IMPORTS = {
+    "GeminiEmbeddings": ".embeddings",
+    "VectorStore": ".vector_store",
+    "LLMClient": ".llm",
+    "ConversationMemory": ".memory",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,244 @@
+"""
+SQLite Connection Pool
+Shared connection settings and process-wide connection pools for SQLite.
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from config import (
+    SQLITE_DB_PATH, SQLITE_POOL_SIZE,
+    SQLITE_FLUSH_BATCH, SQLITE_FLUSH_INTERVAL
+)
+
+# Prepared statements kept per pooled connection (keyed on SQL text)
+SQLITE_STATEMENT_CACHE = 512
+
+# journal_mode=WAL persists in the database file; the others are per connection
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA mmap_size=268435456;
+"""
+
+
+def apply_pragmas(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """
+    Apply WAL journaling and performance settings to a connection.
+    
+    WAL lets readers run alongside the writer, and synchronous=NORMAL
+    syncs on checkpoints only instead of twice per commit.
+    
+    Args:
+        conn: Open SQLite connection
+        
+    Returns:
+        The same connection
+    """
+    conn.executescript(SQLITE_PRAGMAS)
+    return conn
+
+
+class SqlitePool:
+    """
+    Bounded pool of long-lived SQLite connections for one database file.
+    Each connection is used by one thread at a time; pragmas are applied once
+    and prepared statements stay in each connection's statement cache.
+    """
+    
+    def __init__(self, db_path: str, size: int = SQLITE_POOL_SIZE):
+        """
+        Initialize the pool.
+        
+        Args:
+            db_path: Path to SQLite database
+            size: Number of pooled connections
+        """
+        self.db_path = db_path
+        self._pool = queue.Queue(maxsize=size)
+        for _ in range(size):
+            conn = sqlite3.connect(
+                db_path, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE
+            )
+            conn.execute("PRAGMA busy_timeout=5000")
+            # Rows convert straight to dicts and still support positional access
+            conn.row_factory = sqlite3.Row
+            self._pool.put(apply_pragmas(conn))
+    
+    @contextmanager
+    def acquire(self):
+        """Borrow a connection, returning it to the pool afterwards."""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            # Don't hand an uncommitted transaction to the next borrower
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+    
+    def close(self) -> None:
+        """Close all pooled connections, refreshing query planner statistics first."""
+        while not self._pool.empty():
+            conn = self._pool.get_nowait()
+            try:
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                print(f"[SqlitePool Error] {e}")
+            conn.close()
+
+
+# One pool per database file
+_pools: Dict[str, SqlitePool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str = SQLITE_DB_PATH) -> SqlitePool:
+    """Get or create the connection pool for a database file."""
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = _pools[db_path] = SqlitePool(db_path)
+                # Registered before any BatchWriter on this pool, so it runs after their flushes
+                atexit.register(pool.close)
+    return pool
+
+
+class BatchWriteError(sqlite3.DatabaseError):
+    """Rows queued on a BatchWriter that could not be written."""
+    
+    def __init__(self, failures: List[Tuple[tuple, Exception]]):
+        """
+        Initialize the error.
+        
+        Args:
+            failures: (row, error) pairs for every dropped row
+        """
+        self.failures = failures
+        super().__init__(f"{len(failures)} queued rows were not written: {failures[0][1]}")
+
+
+class BatchWriter:
+    """
+    Queues rows for one write statement and commits them from a background
+    thread with a single executemany() per batch, instead of one commit (and
+    fsync) per row. add() never blocks on SQLite.
+    
+    A batch is written when it reaches max_batch rows, flush_interval seconds
+    after its first row, on flush() and at interpreter exit. Rows that cannot
+    be written are logged and reported by the next raising flush() as a
+    BatchWriteError.
+    """
+    
+    def __init__(
+        self,
+        pool: SqlitePool,
+        sql: str,
+        max_batch: int = SQLITE_FLUSH_BATCH,
+        flush_interval: float = SQLITE_FLUSH_INTERVAL
+    ):
+        """
+        Initialize the writer and start its thread.
+        
+        Args:
+            pool: Connection pool to write through
+            sql: Parameterized statement executed for each row
+            max_batch: Rows per batch
+            flush_interval: Maximum seconds a row waits before commit
+        """
+        self.pool = pool
+        self.sql = sql
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        # Rows dropped by the writer thread, raised from the next flush()
+        self._failures: List[Tuple[tuple, Exception]] = []
+        self._failures_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+    
+    def add(self, row: tuple) -> None:
+        """Queue a row for the writer thread."""
+        self._queue.put(row)
+    
+    def flush(self, raise_errors: bool = True) -> None:
+        """
+        Block until every row this thread queued so far is committed.
+        
+        Only this call's marker is waited on, so rows other threads queue
+        meanwhile do not hold it up.
+        
+        Args:
+            raise_errors: Report dropped rows; readers pass False, since the
+                failures belong to whoever owns the writes
+        
+        Raises:
+            BatchWriteError: If rows were dropped since the last reported flush()
+        """
+        # Rows queued before the marker are written in its batch or an earlier one
+        marker = threading.Event()
+        self._queue.put(marker)
+        marker.wait()
+        if not raise_errors:
+            return
+        with self._failures_lock:
+            failures, self._failures = self._failures, []
+        if failures:
+            raise BatchWriteError(failures)
+    
+    def _flush_at_exit(self) -> None:
+        """Final flush at interpreter exit, where there is no caller to raise to."""
+        try:
+            self.flush()
+        except BatchWriteError as e:
+            print(f"[BatchWriter Error] {e}")
+    
+    def _run(self) -> None:
+        """Collect queued rows into batches and write them (writer thread)."""
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # A flush() marker makes the writer commit its current batch immediately
+            while len(items) < self.max_batch and not isinstance(items[-1], threading.Event):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            self._write([item for item in items if not isinstance(item, threading.Event)])
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+    
+    def _write(self, rows: List[tuple]) -> None:
+        """Write rows in one transaction, retrying row by row if the batch fails."""
+        if not rows:
+            return
+        try:
+            with self.pool.acquire() as conn:
+                conn.executemany(self.sql, rows)
+                conn.commit()
+            return
+        except Exception as e:
+            print(f"[BatchWriter Error] Batch of {len(rows)} rows failed, retrying each: {e}")
+        
+        # One bad row must not take the rest of the batch (other sessions' rows) with it
+        for row in rows:
+            try:
+                with self.pool.acquire() as conn:
+                    conn.execute(self.sql, row)
+                    conn.commit()
+            except Exception as e:
+                print(f"[BatchWriter Error] Dropped row: {e}")
+                with self._failures_lock:
+                    self._failures.append((row, e))
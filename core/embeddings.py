@@ -7,9 +7,47 @@ try:
 except ImportError:
     from chromadb.api.types import EmbeddingFunction
 from google import genai
+from google.genai import types
+import asyncio
 import os
+import threading
+import time
 from typing import List
-from config import GEMINI_API_KEY, EMBEDDING_MODEL
+import numpy as np
+from config import (
+    GEMINI_API_KEY, EMBEDDING_MODEL, EMBEDDING_DIM,
+    EMBED_MAX_BATCH_SIZE, EMBED_MAX_BATCH_HOLD, EMBED_USE_BATCH_API
+)
+from .resources import shared_resource
+
+# Maximum number of texts per embed_content request
+MAX_BATCH_SIZE = 100
+
+# Below this many texts, embed_documents_batch() uses synchronous requests
+BATCH_API_THRESHOLD = 100
+
+# Batch job states after which polling stops
+_BATCH_FINAL_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+    "JOB_STATE_PARTIALLY_SUCCEEDED",
+}
+
+
+# Returned (as a copy) for texts that could not be embedded
+_ZERO = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+
+
+def _l2_normalize(vectors) -> List[np.ndarray]:
+    """
+    Scale vectors to unit length, as float32 rows.
+    Truncated (Matryoshka) embeddings are not normalized by the API.
+    """
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    return list(arr / np.where(norms == 0, 1.0, norms))
 
 
 class GeminiEmbeddings(EmbeddingFunction):
@@ -29,57 +67,158 @@ class GeminiEmbeddings(EmbeddingFunction):
         self.client = genai.Client(api_key=self.api_key)
         self.document_mode = document_mode
         self.model = EMBEDDING_MODEL        # must be set before any print that uses it
-        self.embedding_dim = 768
+        self.embedding_dim = EMBEDDING_DIM
         try:
             masked = (self.api_key[:6] + "..." + self.api_key[-4:]) if self.api_key else "(none)"
         except Exception:
             masked = "(masked)"
         print(f"[Embeddings] Initialized model={self.model}, api_key={masked}")
         
-    def __call__(self, input: List[str]) -> List[List[float]]:
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings for a list of texts, using this instance's mode.
+        
+        Args:
+            input: List of text strings to embed
+            
+        Returns:
+            List of embedding vectors
+        """
+        return self._embed(input)
+    
+    def _embed(self, input: List[str], task_type: str = None) -> List[np.ndarray]:
         """
         Generate embeddings for a list of texts.
         
+        ChromaDB wraps __call__ with a single-argument signature, so the
+        per-call task type is passed here instead.
+        
         Args:
             input: List of text strings to embed
+            task_type: Embedding task; defaults to this instance's mode
             
         Returns:
             List of embedding vectors
         """
-        task = "retrieval_document" if self.document_mode else "retrieval_query"
+        task = task_type or ("retrieval_document" if self.document_mode else "retrieval_query")
+        config = types.EmbedContentConfig(
+            task_type=task,
+            output_dimensionality=self.embedding_dim,
+        )
         embeddings = []
         
-        for text in input:
+        for i in range(0, len(input), MAX_BATCH_SIZE):
+            batch = input[i:i + MAX_BATCH_SIZE]
+            try:
+                response = self.client.models.embed_content(
+                    model=self.model,
+                    contents=batch,
+                    config=config,
+                )
+                batch_embeddings = [e.values for e in response.embeddings]
+                if len(batch_embeddings) != len(batch):
+                    raise ValueError(
+                        f"Expected {len(batch)} embeddings, got {len(batch_embeddings)}"
+                    )
+                embeddings.extend(_l2_normalize(batch_embeddings))
+            except Exception as e:
+                print(f"[Embedding Error] Batch failed, retrying per text: {e}")
+                embeddings.extend(self._embed_each(batch, config))
+                
+        return embeddings
+    
+    def _embed_each(self, texts: List[str], config) -> List[np.ndarray]:
+        """Embed texts one request at a time (fallback when a batch fails)."""
+        embeddings = []
+        for text in texts:
             try:
                 response = self.client.models.embed_content(
                     model=self.model,
                     contents=text,
+                    config=config,
                 )
-                embeddings.append(response.embeddings[0].values)
+                embeddings.append(_l2_normalize([response.embeddings[0].values])[0])
             except Exception as e:
                 print(f"[Embedding Error] {e}")
                 # Fallback to zero vector on error
-                embeddings.append([0.0] * self.embedding_dim)
-                
+                embeddings.append(_ZERO.copy())
         return embeddings
     
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    def embed_documents(self, texts: List[str]) -> List[np.ndarray]:
         """
         Embed documents for indexing.
         
+        With EMBED_USE_BATCH_API set, inputs of BATCH_API_THRESHOLD texts or
+        more go through the Batch API (see embed_documents_batch()).
+        
         Args:
             texts: List of document texts
             
         Returns:
             List of embedding vectors
         """
-        original_mode = self.document_mode
-        self.document_mode = True
-        embeddings = self(texts)
-        self.document_mode = original_mode
+        if EMBED_USE_BATCH_API and len(texts) >= BATCH_API_THRESHOLD:
+            return self.embed_documents_batch(texts)
+        return self._embed(texts, task_type="retrieval_document")
+    
+    def embed_documents_batch(self, texts: List[str], poll_interval: float = 5) -> List[np.ndarray]:
+        """
+        Embed documents for bulk indexing through the Gemini Batch API.
+        
+        Batch jobs cost half as much as synchronous requests but are processed
+        asynchronously and can take hours, so this blocks until the job ends.
+        Small inputs and failed jobs fall back to synchronous requests.
+        
+        Args:
+            texts: List of document texts
+            poll_interval: Seconds between job status checks
+            
+        Returns:
+            List of embedding vectors, in input order
+        """
+        if len(texts) < BATCH_API_THRESHOLD:
+            return self._embed(texts, task_type="retrieval_document")
+        
+        try:
+            job = self.client.batches.create_embeddings(
+                model=self.model,
+                src=types.EmbeddingsBatchJobSource(
+                    inlined_requests=types.EmbedContentBatch(
+                        contents=texts,
+                        config=types.EmbedContentConfig(
+                            task_type="retrieval_document",
+                            output_dimensionality=self.embedding_dim,
+                        ),
+                    )
+                ),
+            )
+            print(f"[Embeddings] Submitted batch job {job.name} ({len(texts)} texts)")
+            
+            while job.state is None or job.state.name not in _BATCH_FINAL_STATES:
+                time.sleep(poll_interval)
+                job = self.client.batches.get(name=job.name)
+            
+            responses = (job.dest.inlined_embed_content_responses or []) if job.dest else []
+            if len(responses) != len(texts):
+                raise RuntimeError(
+                    f"Batch job {job.name} ended in {job.state.name} "
+                    f"with {len(responses)}/{len(texts)} results"
+                )
+        except Exception as e:
+            print(f"[Embedding Error] Batch job failed, embedding synchronously: {e}")
+            return self._embed(texts, task_type="retrieval_document")
+        
+        embeddings = []
+        for item in responses:
+            if item.error or not item.response or not item.response.embedding:
+                print(f"[Embedding Error] {item.error}")
+                # Fallback to zero vector on error
+                embeddings.append(_ZERO.copy())
+            else:
+                embeddings.append(_l2_normalize([item.response.embedding.values])[0])
         return embeddings
     
-    def embed_query(self, text: str = None, input = None) -> List[List[float]]:
+    def embed_query(self, text: str = None, input = None) -> List[np.ndarray]:
         """
         Embed a single query for retrieval.
         
@@ -95,33 +234,124 @@ class GeminiEmbeddings(EmbeddingFunction):
         # ChromaDB may pass a list of strings
         if isinstance(query_input, str):
             query_input = [query_input]
-        original_mode = self.document_mode
-        self.document_mode = False
-        embeddings = self(query_input)
-        self.document_mode = original_mode
-        return embeddings
+        return self._embed(query_input, task_type="retrieval_query")
     
-    def batch_embed(self, texts: List[str], batch_size: int = 10) -> List[List[float]]:
+    def batch_embed(self, texts: List[str], batch_size: int = MAX_BATCH_SIZE) -> List[np.ndarray]:
         """
         Embed texts in batches for efficiency.
         
         Args:
             texts: List of texts to embed
-            batch_size: Number of texts per batch
+            batch_size: Number of texts per embed_content request
             
         Returns:
             List of embedding vectors
         """
         all_embeddings = []
         for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self(batch)
-            all_embeddings.extend(batch_embeddings)
+            all_embeddings.extend(self(texts[i:i + batch_size]))
         return all_embeddings
 
 
-# Singleton instance for reuse
-_embedding_instance = None
+class BatchedEmbedder:
+    """
+    Micro-batches concurrent query embeddings into single API requests.
+    
+    Requests from any thread or event loop are queued on a private event loop;
+    a worker collects up to max_batch_size texts, waiting at most
+    max_batch_hold seconds after the first one, and embeds them in one call.
+    """
+    
+    def __init__(
+        self,
+        embeddings: GeminiEmbeddings,
+        max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+        max_batch_hold: float = EMBED_MAX_BATCH_HOLD
+    ):
+        """
+        Initialize the batcher and start its worker thread.
+        
+        Args:
+            embeddings: Embedding function used for the batched calls
+            max_batch_size: Maximum texts per request
+            max_batch_hold: Seconds to wait for more texts before sending
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_batch_hold = max_batch_hold
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+    
+    def _run(self) -> None:
+        """Run the private event loop (worker thread)."""
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._worker())
+        self._ready.set()
+        self._loop.run_forever()
+    
+    async def _worker(self) -> None:
+        """Collect queued requests into batches and resolve their futures."""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_batch_hold
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            texts = [text for text, _ in batch]
+            try:
+                # Blocking API call runs off the loop so new requests keep queueing
+                vectors = await self._loop.run_in_executor(
+                    None, lambda: self.embeddings.embed_query(input=texts)
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                # Skip callers that gave up (cancelled) while the batch was in flight
+                if not future.done():
+                    future.set_result(vector)
+    
+    async def _submit(self, text: str) -> np.ndarray:
+        """Queue a text and wait for its embedding (runs on the private loop)."""
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    async def embed_one(self, text: str) -> np.ndarray:
+        """
+        Embed a single query, batched with concurrent requests.
+        
+        Args:
+            text: Query text
+            
+        Returns:
+            Embedding vector
+        """
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._submit(text), self._loop)
+        )
+    
+    def embed_one_sync(self, text: str) -> np.ndarray:
+        """Blocking variant of embed_one() for threaded callers (e.g. Streamlit sessions)."""
+        return asyncio.run_coroutine_threadsafe(self._submit(text), self._loop).result()
+
+
+# Shared instances, one per mode, created once per process
+@shared_resource
+def _shared_embeddings(document_mode: bool) -> GeminiEmbeddings:
+    return GeminiEmbeddings(document_mode=document_mode)
 
 def get_embedding_function(document_mode: bool = True) -> GeminiEmbeddings:
     """
@@ -133,8 +363,10 @@ def get_embedding_function(document_mode: bool = True) -> GeminiEmbeddings:
     Returns:
         GeminiEmbeddings instance
     """
-    global _embedding_instance
-    if _embedding_instance is None:
-        _embedding_instance = GeminiEmbeddings()
-    _embedding_instance.document_mode = document_mode
-    return _embedding_instance
+    return _shared_embeddings(document_mode)
+
+
+@shared_resource
+def get_batched_embedder() -> BatchedEmbedder:
+    """Get the shared query-embedding micro-batcher."""
+    return BatchedEmbedder(get_embedding_function(document_mode=False))
@@ -2,11 +2,79 @@
 LLM Client Module
 Wrapper for Gemini LLM with conversation support and prompt templates.
 """
+import asyncio
+import random
+import re
 import time
+from itertools import chain
 from google import genai
 from google.genai import types
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 from config import GEMINI_API_KEY, LLM_MODEL, MAX_CONTEXT_LENGTH
+from .resources import shared_data, shared_resource
+
+# Conversation turns included in RAG prompts
+PROMPT_HISTORY_TURNS = 5
+
+# Short greetings / small-talk that never need an LLM call
+_GREETING_RE = re.compile(
+    r'^(hi|hello|hey|bonjour|salut|salam|bonsoir|'
+    r'good\s*(morning|afternoon|evening)|how\s*are\s*you|'
+    r'what\'?s?\s*up|yo|thanks|thank\s*you|merci|'
+    r'bye|goodbye|au\s*revoir|aidez|comment\s*vas)\s*[!?.]*$',
+    re.IGNORECASE,
+)
+
+# Keywords that route straight to the admin agent
+_ADMIN_KW = ('student data', 'system metric', 'all users', 'manage document')
+
+# Pronouns / follow-up openers that make a query depend on the conversation
+_COREF_RE = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|"
+    r"ça|ca|cela|ceci|il|elle|ils|elles|celui|celle|leur)\b"
+    r"|^\s*(and|what about|how about|et|sinon)\b",
+    re.IGNORECASE,
+)
+
+# Queries with at least this many words and no coreference are used as-is
+REWRITE_MIN_WORDS = 4
+
+# Memoization of context-free LLM calls (classification, rewrite)
+LLM_CACHE_TTL = 3600
+LLM_CACHE_ENTRIES = 1000
+
+# Backoff bounds for retried requests (seconds)
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# Rate limits (429) and transient server errors (500/503) are worth retrying
+_RETRYABLE_CODES = {429, 500, 503}
+_RETRYABLE_MARKERS = ("429", "RESOURCE_EXHAUSTED", "500", "INTERNAL", "503", "UNAVAILABLE")
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def _retry_wait(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying a failed request.
+    
+    Args:
+        error: Exception raised by the Gemini client
+        attempt: Zero-based attempt number
+        
+    Returns:
+        Wait time, or None if the error is not transient
+    """
+    err = str(error)
+    code = getattr(error, "code", None)
+    retryable = code in _RETRYABLE_CODES if code is not None else any(m in err for m in _RETRYABLE_MARKERS)
+    if not retryable:
+        return None
+    # Honour the server's google.rpc.RetryInfo delay, e.g. "retryDelay": "27s"
+    match = _RETRY_DELAY_RE.search(str(getattr(error, "details", None) or err))
+    if match:
+        return float(match.group(1))
+    # Full jitter keeps concurrent sessions from retrying in lockstep
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
 
 
 class LLMClient:
@@ -32,12 +100,22 @@ class LLMClient:
         print(f"[LLM] Initialized client model={model_name}, api_key={masked_key}")
         self.model_name = model_name
         self.max_context = MAX_CONTEXT_LENGTH
+        # The system prompt goes in system_instruction and the per-session history
+        # comes before the per-query references, so consecutive calls share the
+        # longest possible prefix (Gemini caches repeated prefixes implicitly).
+        self._prompt_template = (
+            "{hist_label}\n{hist}\n"
+            "REFERENCE INFORMATION:\n{ctx}\n\n"
+            "USER QUESTION: {q}\n\n"
+            "Provide a helpful, accurate response based on the reference information above.\n"
+        )
         
     def generate(
         self,
         prompt: str,
         system_instruction: str = None,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        raise_errors: bool = False
     ) -> str:
         """
         Generate a response from the LLM.
@@ -46,6 +124,7 @@ class LLMClient:
             prompt: The user prompt
             system_instruction: Optional system instruction
             temperature: Sampling temperature
+            raise_errors: Raise API errors instead of returning an apology text
             
         Returns:
             Generated text response
@@ -59,28 +138,123 @@ class LLMClient:
             response = self._call_with_retry(prompt, config)
             return response.text
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"[LLM Error] {e}")
             return f"I apologize, but I encountered an error: {str(e)}"
 
-    def _call_with_retry(self, prompt: str, config, max_retries: int = 3):
-        """Call Gemini API with exponential backoff on rate limits."""
+    def generate_stream(
+        self,
+        prompt: str,
+        system_instruction: str = None,
+        temperature: float = 0.7
+    ) -> Iterator[str]:
+        """
+        Stream a response from the LLM as it is generated.
+        
+        Args:
+            prompt: The user prompt
+            system_instruction: Optional system instruction
+            temperature: Sampling temperature
+            
+        Yields:
+            Text chunks of the response
+        """
+        try:
+            config = types.GenerateContentConfig(
+                temperature=temperature,
+            )
+            if system_instruction:
+                config.system_instruction = system_instruction
+            for chunk in self._call_with_retry(prompt, config, stream=True):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"[LLM Error] {e}")
+            yield f"I apologize, but I encountered an error: {str(e)}"
+
+    async def agenerate(
+        self,
+        prompt: str,
+        system_instruction: str = None,
+        temperature: float = 0.7,
+        raise_errors: bool = False
+    ) -> str:
+        """
+        Async variant of generate() using the genai async client.
+        
+        Args:
+            prompt: The user prompt
+            system_instruction: Optional system instruction
+            temperature: Sampling temperature
+            raise_errors: Raise API errors instead of returning an apology text
+            
+        Returns:
+            Generated text response
+        """
+        try:
+            config = types.GenerateContentConfig(
+                temperature=temperature,
+            )
+            if system_instruction:
+                config.system_instruction = system_instruction
+            response = await self._acall_with_retry(prompt, config)
+            return response.text
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"[LLM Error] {e}")
+            return f"I apologize, but I encountered an error: {str(e)}"
+
+    def _call_with_retry(self, prompt: str, config, max_retries: int = 3, stream: bool = False):
+        """
+        Call Gemini API with jittered exponential backoff on rate limits and 5xx errors.
+        With stream=True, returns an iterator over response chunks.
+        """
         for attempt in range(max_retries):
             try:
                 if attempt > 0:
                     print(f"[LLM] Retry {attempt+1}/{max_retries} model={self.model_name}")
+                if stream:
+                    response = self.client.models.generate_content_stream(
+                        model=self.model_name,
+                        contents=prompt,
+                        config=config,
+                    )
+                    # Rate-limit errors surface on the first chunk, so fetch it inside the retry
+                    first = next(response, None)
+                    return chain([first] if first is not None else [], response)
                 return self.client.models.generate_content(
                     model=self.model_name,
                     contents=prompt,
                     config=config,
                 )
             except Exception as e:
-                err = str(e)
-                if ("429" in err or "RESOURCE_EXHAUSTED" in err) and attempt < max_retries - 1:
-                    wait = 15 * (attempt + 1)
-                    print(f"[LLM] Rate limited, waiting {wait}s (attempt {attempt + 1}/{max_retries})...")
+                wait = _retry_wait(e, attempt)
+                if wait is not None and attempt < max_retries - 1:
+                    print(f"[LLM] Transient error, waiting {wait:.1f}s (attempt {attempt + 1}/{max_retries}): {e}")
                     time.sleep(wait)
                 else:
                     raise
+
+    async def _acall_with_retry(self, prompt: str, config, max_retries: int = 3):
+        """Async variant of _call_with_retry()."""
+        for attempt in range(max_retries):
+            try:
+                if attempt > 0:
+                    print(f"[LLM] Retry {attempt+1}/{max_retries} model={self.model_name}")
+                return await self.client.aio.models.generate_content(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=config,
+                )
+            except Exception as e:
+                wait = _retry_wait(e, attempt)
+                if wait is not None and attempt < max_retries - 1:
+                    print(f"[LLM] Transient error, waiting {wait:.1f}s (attempt {attempt + 1}/{max_retries}): {e}")
+                    await asyncio.sleep(wait)
+                else:
+                    raise
     
     def generate_with_context(
         self,
@@ -101,42 +275,69 @@ class LLMClient:
         Returns:
             Generated response
         """
+        prompt, system_prompt = self._build_context_prompt(
+            query, context_passages, conversation_history, system_prompt
+        )
+        return self.generate(prompt, system_instruction=system_prompt)
+    
+    def generate_with_context_stream(
+        self,
+        query: str,
+        context_passages: List[str],
+        conversation_history: List[Dict[str, str]] = None,
+        system_prompt: str = None
+    ) -> Iterator[str]:
+        """
+        Streaming variant of generate_with_context().
+        
+        Yields:
+            Text chunks of the response
+        """
+        prompt, system_prompt = self._build_context_prompt(
+            query, context_passages, conversation_history, system_prompt
+        )
+        return self.generate_stream(prompt, system_instruction=system_prompt)
+    
+    def _build_context_prompt(
+        self,
+        query: str,
+        context_passages: List[str],
+        conversation_history: List[Dict[str, str]] = None,
+        system_prompt: str = None
+    ) -> tuple:
+        """Build the RAG prompt and system instruction for generate_with_context()."""
         if system_prompt is None:
             system_prompt = self._default_university_prompt()
             
         # Build context from passages
-        context = "\n\n".join([
+        context = "\n\n".join(
             f"[Reference {i+1}]: {passage}"
             for i, passage in enumerate(context_passages)
-        ])
+        )
         
         # Build conversation history
         history_text = ""
         if conversation_history:
-            for turn in conversation_history[-5:]:  # Last 5 turns
-                history_text += f"User: {turn.get('user', '')}\n"
-                history_text += f"Assistant: {turn.get('assistant', '')}\n\n"
+            history_text = "".join(
+                f"User: {turn.get('user', '')}\nAssistant: {turn.get('assistant', '')}\n\n"
+                for turn in conversation_history[-PROMPT_HISTORY_TURNS:]
+            )
         
-        # Construct final prompt
-        prompt = f"""
-{system_prompt}
-
-REFERENCE INFORMATION:
-{context}
-
-{"PREVIOUS CONVERSATION:" if history_text else ""}
-{history_text}
-
-USER QUESTION: {query}
-
-Provide a helpful, accurate response based on the reference information above.
-"""
+        fields = {
+            "hist_label": "PREVIOUS CONVERSATION:" if history_text else "",
+            "hist": history_text,
+            "ctx": context,
+            "q": query,
+        }
+        prompt = self._prompt_template.format(**fields)
         
-        # Truncate if too long
-        if len(prompt) > self.max_context:
-            prompt = prompt[:self.max_context] + "\n[Context truncated due to length]"
+        # Truncate the references if too long, keeping the question intact
+        overflow = len(system_prompt) + len(prompt) - self.max_context
+        if overflow > 0:
+            fields["ctx"] = context[:max(0, len(context) - overflow)] + "\n[Context truncated due to length]"
+            prompt = self._prompt_template.format(**fields)
             
-        return self.generate(prompt)
+        return prompt, system_prompt
     
     def _default_university_prompt(self) -> str:
         """Default system prompt for university assistant."""
@@ -152,62 +353,135 @@ Guidelines:
 - For complex procedures, break down steps clearly
 - Do not invent or assume information not present in the references"""
 
-    def classify_intent(self, query: str) -> str:
+    def classify_intent(self, query: str, raise_errors: bool = False) -> str:
         """
         Classify the intent of a user query.
         Uses keyword fast-paths to avoid an LLM call when intent is obvious.
         
         Args:
             query: User's question
+            raise_errors: Raise API errors instead of falling back to 'qa'
             
         Returns:
             Intent category: 'qa', 'admin', 'general'
         """
-        import re
+        intent = self.fast_intent(query)
+        if intent:
+            return intent
+
+        # Fallback: ask the LLM only for ambiguous cases
+        try:
+            response = self.generate(self._intent_prompt(query), temperature=0.1, raise_errors=True)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"[LLM Error] {e}")
+            return 'qa'
+        return self._parse_intent(response)
+
+    async def aclassify_intent(self, query: str) -> str:
+        """Async variant of classify_intent()."""
+        intent = self.fast_intent(query)
+        if intent:
+            return intent
+
+        try:
+            response = await self.agenerate(self._intent_prompt(query), temperature=0.1, raise_errors=True)
+        except Exception as e:
+            print(f"[LLM Error] {e}")
+            return 'qa'
+        return self._parse_intent(response)
+
+    def fast_intent(self, query: str) -> Optional[str]:
+        """
+        Keyword fast-paths for intent classification.
+        
+        Returns:
+            Intent category, or None if the LLM is needed
+        """
         q = query.strip()
 
         # Fast-path: short greetings / small-talk → no LLM call
-        _greeting_re = re.compile(
-            r'^(hi|hello|hey|bonjour|salut|salam|bonsoir|'
-            r'good\s*(morning|afternoon|evening)|how\s*are\s*you|'
-            r'what\'?s?\s*up|yo|thanks|thank\s*you|merci|'
-            r'bye|goodbye|au\s*revoir|aidez|comment\s*vas)\s*[!?.]*$',
-            re.IGNORECASE,
-        )
-        if _greeting_re.match(q):
+        if _GREETING_RE.match(q):
             return 'general'
 
         # Fast-path: admin keywords → no LLM call
-        _admin_kw = ['student data', 'system metric', 'all users', 'manage document']
-        if any(kw in q.lower() for kw in _admin_kw):
+        ql = q.lower()
+        if any(kw in ql for kw in _ADMIN_KW):
             return 'admin'
 
-        # Fallback: ask the LLM only for ambiguous cases
-        prompt = f"""Classify the following user query into one of these categories:
+        return None
+
+    def _intent_prompt(self, query: str) -> str:
+        """Build the LLM prompt for intent classification."""
+        return f"""Classify the following user query into one of these categories:
 - qa: Questions about university policies, procedures, academics, administration
 - admin: Administrative queries about student data, system metrics (staff only)
 - general: General greetings, off-topic, or unclear queries
 
-Query: "{q}"
+Query: "{query.strip()}"
 
 Respond with ONLY the category name (qa, admin, or general):"""
 
-        response = self.generate(prompt, temperature=0.1)
+    def _parse_intent(self, response: str) -> str:
+        """Map the LLM's answer to a valid intent."""
         intent = response.strip().lower()
         valid_intents = ['qa', 'admin', 'general']
         return intent if intent in valid_intents else 'qa'
     
-    def rewrite_query(self, query: str, conversation_history: List[Dict] = None) -> str:
+    def rewrite_query(
+        self,
+        query: str,
+        conversation_history: List[Dict] = None,
+        raise_errors: bool = False
+    ) -> str:
         """
         Rewrite a query for better retrieval.
         
         Args:
             query: Original user query
             conversation_history: Previous conversation for context
+            raise_errors: Raise API errors instead of returning the original query
             
         Returns:
             Rewritten query optimized for retrieval
         """
+        if not self._needs_rewrite(query):
+            return query
+        prompt = self._rewrite_prompt(query, conversation_history)
+        try:
+            rewritten = self.generate(prompt, temperature=0.2, raise_errors=True)
+        except Exception as e:
+            if raise_errors:
+                raise
+            # An error message must never become the search query
+            print(f"[LLM Error] {e}")
+            return query
+        return rewritten.strip().strip('"')
+
+    async def arewrite_query(self, query: str, conversation_history: List[Dict] = None) -> str:
+        """Async variant of rewrite_query()."""
+        if not self._needs_rewrite(query):
+            return query
+        prompt = self._rewrite_prompt(query, conversation_history)
+        try:
+            rewritten = await self.agenerate(prompt, temperature=0.2, raise_errors=True)
+        except Exception as e:
+            print(f"[LLM Error] {e}")
+            return query
+        return rewritten.strip().strip('"')
+
+    @staticmethod
+    def _needs_rewrite(query: str) -> bool:
+        """
+        Whether a rewrite is likely to change the query.
+        Long, self-contained queries are already good search queries; only
+        short ones or those with a coreference / ellipsis go to the LLM.
+        """
+        return len(query.split()) < REWRITE_MIN_WORDS or bool(_COREF_RE.search(query))
+
+    def _rewrite_prompt(self, query: str, conversation_history: List[Dict] = None) -> str:
+        """Build the LLM prompt for query rewriting."""
         context = ""
         if conversation_history:
             recent = conversation_history[-3:]
@@ -215,7 +489,7 @@ Respond with ONLY the category name (qa, admin, or general):"""
                 f"User: {t.get('user', '')}" for t in recent
             ])
             
-        prompt = f"""Rewrite the following query to be more specific and better suited for searching a university document database.
+        return f"""Rewrite the following query to be more specific and better suited for searching a university document database.
 If the query references previous conversation, make it self-contained.
 
 {"Recent conversation:" if context else ""}
@@ -225,16 +499,41 @@ Original query: "{query}"
 
 Rewritten query (output ONLY the rewritten query, nothing else):"""
 
-        rewritten = self.generate(prompt, temperature=0.2)
-        return rewritten.strip().strip('"')
-
 
-# Singleton instance
-_llm_instance = None
+# Shared instance, created once per process
+@shared_resource
+def _shared_llm_client() -> LLMClient:
+    return LLMClient()
 
 def get_llm_client() -> LLMClient:
     """Get or create LLM client singleton."""
-    global _llm_instance
-    if _llm_instance is None:
-        _llm_instance = LLMClient()
-    return _llm_instance
+    return _shared_llm_client()
+
+
+# Memoized calls raise on API errors, so a failure is never cached
+@shared_data(ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_ENTRIES)
+def _memo_classify_intent(query: str) -> str:
+    return get_llm_client().classify_intent(query, raise_errors=True)
+
+
+@shared_data(ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_ENTRIES)
+def _memo_rewrite_query(query: str) -> str:
+    return get_llm_client().rewrite_query(query, raise_errors=True)
+
+
+def cached_classify_intent(query: str) -> str:
+    """classify_intent() memoized by query string across sessions."""
+    try:
+        return _memo_classify_intent(query)
+    except Exception as e:
+        print(f"[LLM Error] {e}")
+        return 'qa'
+
+
+def cached_rewrite_query(query: str) -> str:
+    """rewrite_query() without conversation history, memoized by query string."""
+    try:
+        return _memo_rewrite_query(query)
+    except Exception as e:
+        print(f"[LLM Error] {e}")
+        return query
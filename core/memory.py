@@ -2,15 +2,69 @@
 Conversation Memory Module
 Manages chat history and user context across sessions.
 """
-import sqlite3
+import itertools
+import json
+import time
+from collections import deque
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from config import SQLITE_DB_PATH, MAX_CONVERSATION_HISTORY
+from .db_pool import get_pool, BatchWriter
+
+try:
+    import zstandard
+    _compressor = zstandard.ZstdCompressor(level=3)
+except ImportError:
+    zstandard = None
+
+# Hot-path statements, kept as constants so every call reuses the cached prepared statement
+SQL_ADD_TURN = """
+    INSERT INTO conversations 
+    (session_id, user_id, query, response, intent, context_chunks)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+SQL_GET_HISTORY = """
+    SELECT query AS "user", response AS assistant, intent, timestamp
+    FROM conversations
+    WHERE session_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+SQL_GET_USER_HISTORY = """
+    SELECT session_id, query AS "user", response AS assistant, intent, timestamp
+    FROM conversations
+    WHERE user_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+# Per-intent aggregates; session totals are folded up in Python
+SQL_SESSION_SUMMARY = """
+    SELECT 
+        intent,
+        COUNT(*) as turns,
+        MIN(timestamp) as start_time,
+        MAX(timestamp) as end_time
+    FROM conversations
+    WHERE session_id = ?
+    GROUP BY intent
+"""
+
+
+def _encode_chunks(chunks: List[str]) -> Optional[bytes]:
+    """Encode context passages as JSON, zstd-compressed when available."""
+    if not chunks:
+        return None
+    data = json.dumps(chunks, ensure_ascii=False).encode("utf-8")
+    return _compressor.compress(data) if zstandard else data
 
 
 class ConversationMemory:
     """
     Manages conversation history with persistence.
+    Turns are buffered and committed in batches; reads flush the buffer first.
     """
     
     def __init__(self, db_path: str = SQLITE_DB_PATH):
@@ -21,37 +75,46 @@ class ConversationMemory:
             db_path: Path to SQLite database
         """
         self.db_path = db_path
+        self._pool = get_pool(db_path)
         self._init_db()
+        self._writer = BatchWriter(self._pool, SQL_ADD_TURN)
         
-    def _get_conn(self) -> sqlite3.Connection:
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
-    
     def _init_db(self) -> None:
         """Initialize conversation tables."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                user_id TEXT,
-                query TEXT NOT NULL,
-                response TEXT NOT NULL,
-                intent TEXT,
-                context_chunks TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        c.execute("""
-            CREATE INDEX IF NOT EXISTS idx_session 
-            ON conversations(session_id, timestamp)
-        """)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    user_id TEXT,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    intent TEXT,
+                    context_chunks BLOB,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        
+            c.execute("""
+                CREATE INDEX IF NOT EXISTS idx_session 
+                ON conversations(session_id, timestamp)
+            """)
+            
+            # get_user_history filters on user_id and sorts newest first
+            c.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_time
+                ON conversations(user_id, timestamp DESC)
+            """)
+            
+            # get_session_summary groups a session's turns by intent
+            c.execute("""
+                CREATE INDEX IF NOT EXISTS idx_session_intent
+                ON conversations(session_id, intent)
+            """)
         
-        conn.commit()
-        conn.close()
+            conn.commit()
         
     def add_turn(
         self,
@@ -61,7 +124,7 @@ class ConversationMemory:
         user_id: str = None,
         intent: str = None,
         context_chunks: List[str] = None
-    ) -> int:
+    ) -> None:
         """
         Add a conversation turn.
         
@@ -72,26 +135,23 @@ class ConversationMemory:
             user_id: Optional user identifier
             intent: Classified intent
             context_chunks: Retrieved context passages
-            
-        Returns:
-            ID of the inserted record
-        """
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        chunks_str = "|".join(context_chunks) if context_chunks else ""
         
-        c.execute("""
-            INSERT INTO conversations 
-            (session_id, user_id, query, response, intent, context_chunks)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (session_id, user_id, query, response, intent, chunks_str))
+        The turn is written with the next batch; SQLite assigns its id then,
+        so ids stay unique across processes sharing the database.
+        """
+        # Passages may contain "|" and repeat across turns, so store compressed JSON
+        chunks_blob = _encode_chunks(context_chunks)
         
-        record_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        self._writer.add((session_id, user_id, query, response, intent, chunks_blob))
+    
+    def flush(self) -> None:
+        """
+        Commit buffered turns.
         
-        return record_id
+        Raises:
+            BatchWriteError: If turns were dropped since the last flush()
+        """
+        self._writer.flush()
     
     def get_history(
         self,
@@ -108,30 +168,16 @@ class ConversationMemory:
         Returns:
             List of conversation turns as dicts
         """
-        conn = self._get_conn()
-        c = conn.cursor()
+        self._writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            SELECT query, response, intent, timestamp
-            FROM conversations
-            WHERE session_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (session_id, limit))
+            c.execute(SQL_GET_HISTORY, (session_id, limit))
         
-        rows = c.fetchall()
-        conn.close()
+            history = [dict(row) for row in c]
         
         # Return in chronological order
-        history = []
-        for row in reversed(rows):
-            history.append({
-                "user": row[0],
-                "assistant": row[1],
-                "intent": row[2],
-                "timestamp": row[3]
-            })
-            
+        history.reverse()
         return history
     
     def get_user_history(
@@ -149,30 +195,13 @@ class ConversationMemory:
         Returns:
             List of conversation turns
         """
-        conn = self._get_conn()
-        c = conn.cursor()
+        self._writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            SELECT session_id, query, response, intent, timestamp
-            FROM conversations
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (user_id, limit))
+            c.execute(SQL_GET_USER_HISTORY, (user_id, limit))
         
-        rows = c.fetchall()
-        conn.close()
-        
-        return [
-            {
-                "session_id": row[0],
-                "user": row[1],
-                "assistant": row[2],
-                "intent": row[3],
-                "timestamp": row[4]
-            }
-            for row in rows
-        ]
+            return [dict(row) for row in c]
     
     def clear_session(self, session_id: str) -> int:
         """
@@ -184,16 +213,16 @@ class ConversationMemory:
         Returns:
             Number of records deleted
         """
-        conn = self._get_conn()
-        c = conn.cursor()
+        self._writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            DELETE FROM conversations WHERE session_id = ?
-        """, (session_id,))
+            c.execute("""
+                DELETE FROM conversations WHERE session_id = ?
+            """, (session_id,))
         
-        deleted = c.rowcount
-        conn.commit()
-        conn.close()
+            deleted = c.rowcount
+            conn.commit()
         
         return deleted
     
@@ -207,37 +236,20 @@ class ConversationMemory:
         Returns:
             Summary with turn count, intents, duration
         """
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT 
-                COUNT(*) as turns,
-                MIN(timestamp) as start_time,
-                MAX(timestamp) as end_time
-            FROM conversations
-            WHERE session_id = ?
-        """, (session_id,))
-        
-        row = c.fetchone()
+        self._writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        # Get intent distribution
-        c.execute("""
-            SELECT intent, COUNT(*) as count
-            FROM conversations
-            WHERE session_id = ?
-            GROUP BY intent
-        """, (session_id,))
+            c.execute(SQL_SESSION_SUMMARY, (session_id,))
         
-        intents = {r[0]: r[1] for r in c.fetchall() if r[0]}
-        conn.close()
+            rows = c.fetchall()
         
         return {
             "session_id": session_id,
-            "total_turns": row[0],
-            "start_time": row[1],
-            "end_time": row[2],
-            "intents": intents
+            "total_turns": sum(r[1] for r in rows),
+            "start_time": min((r[2] for r in rows), default=None),
+            "end_time": max((r[3] for r in rows), default=None),
+            "intents": {r[0]: r[1] for r in rows if r[0]}
         }
 
 
@@ -255,45 +267,63 @@ class SessionMemory:
             max_turns: Maximum turns to keep in memory
         """
         self.max_turns = max_turns
-        self._sessions: Dict[str, List[Dict]] = {}
+        self._sessions: Dict[str, deque] = {}
+        # Last rendered context string per session, keyed on (history length, last_n)
+        self._ctx_cache: Dict[str, tuple] = {}
         
     def add_turn(self, session_id: str, query: str, response: str) -> None:
         """Add a turn to session memory."""
+        self._ctx_cache.pop(session_id, None)
         if session_id not in self._sessions:
-            self._sessions[session_id] = []
+            # Bounded deque drops the oldest turn in O(1) once max_turns is reached
+            self._sessions[session_id] = deque(maxlen=self.max_turns)
             
+        # Integer timestamp; formatted only when history is handed out
         self._sessions[session_id].append({
             "user": query,
             "assistant": response,
-            "timestamp": datetime.now().isoformat()
+            "ts_ns": time.time_ns()
         })
-        
-        # Trim to max turns
-        if len(self._sessions[session_id]) > self.max_turns:
-            self._sessions[session_id] = self._sessions[session_id][-self.max_turns:]
             
+    @staticmethod
+    def _to_iso(ts_ns: int) -> str:
+        """Format a time_ns() timestamp as local ISO 8601."""
+        return datetime.fromtimestamp(ts_ns / 1e9).isoformat()
+    
     def get_history(self, session_id: str) -> List[Dict]:
-        """Get history for a session."""
-        return self._sessions.get(session_id, [])
+        """
+        Get history for a session (a list snapshot, safe to slice).
+        Turns carry their raw "ts_ns" timestamp; nothing is formatted here.
+        """
+        return list(self._sessions.get(session_id, ()))
+    
+    def get_timestamped_history(self, session_id: str) -> List[Dict]:
+        """Get history for display, with ISO 8601 "timestamp" strings."""
+        return [
+            {"user": turn["user"], "assistant": turn["assistant"], "timestamp": self._to_iso(turn["ts_ns"])}
+            for turn in self._sessions.get(session_id, ())
+        ]
     
     def clear_session(self, session_id: str) -> None:
         """Clear a session from memory."""
+        self._ctx_cache.pop(session_id, None)
         if session_id in self._sessions:
             del self._sessions[session_id]
             
     def get_context_string(self, session_id: str, last_n: int = 3) -> str:
         """Get recent history as a formatted string."""
-        history = self.get_history(session_id)[-last_n:]
-        
-        if not history:
-            return ""
-            
-        lines = []
-        for turn in history:
-            lines.append(f"User: {turn['user']}")
-            lines.append(f"Assistant: {turn['assistant']}")
-            
-        return "\n".join(lines)
+        history = self._sessions.get(session_id, ())
+        key = (len(history), last_n)
+        cached = self._ctx_cache.get(session_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        rendered = "\n".join(
+            f"User: {turn['user']}\nAssistant: {turn['assistant']}"
+            for turn in itertools.islice(history, max(0, len(history) - last_n), None)
+        )
+        self._ctx_cache[session_id] = (key, rendered)
+        return rendered
 
 
 # Singleton instances
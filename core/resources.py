@@ -0,0 +1,51 @@
+"""
+Shared Resources Module
+Process-wide caching for expensive clients (API clients, embedding functions).
+"""
+from functools import lru_cache
+
+try:
+    from streamlit import cache_data, cache_resource, runtime
+except ImportError:
+    cache_data = cache_resource = runtime = None
+
+
+def shared_resource(func):
+    """
+    Cache a resource factory for the lifetime of the process.
+    
+    Under `streamlit run` this is st.cache_resource, so the resource survives
+    script reruns and module reloads and is shared by all sessions. Outside
+    Streamlit (ingestion scripts, CLI) it falls back to functools.lru_cache.
+    
+    Args:
+        func: Factory function; its arguments must be hashable
+        
+    Returns:
+        Cached factory
+    """
+    if cache_resource is not None and runtime.exists():
+        return cache_resource(show_spinner=False)(func)
+    return lru_cache(maxsize=None)(func)
+
+
+def shared_data(ttl: float, max_entries: int):
+    """
+    Memoize a function of hashable arguments, shared by all sessions.
+    
+    Under `streamlit run` this is st.cache_data with the given TTL and size.
+    Outside Streamlit it falls back to an LRU of max_entries (no TTL, since
+    such processes are short-lived).
+    
+    Args:
+        ttl: Seconds before a cached value expires
+        max_entries: Maximum number of cached values
+        
+    Returns:
+        Decorator
+    """
+    def decorator(func):
+        if cache_data is not None and runtime.exists():
+            return cache_data(ttl=ttl, max_entries=max_entries, show_spinner=False)(func)
+        return lru_cache(maxsize=max_entries)(func)
+    return decorator
@@ -2,10 +2,19 @@
 Vector Store Module
 Multi-collection ChromaDB wrapper with metadata filtering support.
 """
+import asyncio
 import chromadb
+import numpy as np
 from typing import List, Dict, Any, Optional
 from config import CHROMA_DB_PATH, DEFAULT_COLLECTION, TOP_K_RESULTS
 from .embeddings import get_embedding_function
+from .resources import shared_resource
+
+# Fields fetched for retrieval; embeddings are left out unless explicitly requested
+RETRIEVAL_INCLUDE = ["documents", "metadatas", "distances"]
+
+# Reciprocal Rank Fusion constant (Cormack et al.); damps the weight of top ranks
+RRF_K = 60
 
 
 class VectorStore:
@@ -23,21 +32,23 @@ class VectorStore:
         self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
         self.collection_name = collection_name
         self._collection = None
+        # Resolved once; documents are indexed and queries embedded with different task types
+        self._embed_doc = get_embedding_function(document_mode=True)
+        self._embed_query = get_embedding_function(document_mode=False)
         
     @property
     def collection(self):
         """Lazy load collection with embedding function."""
         if self._collection is None:
-            embed_fn = get_embedding_function(document_mode=True)
             try:
                 self._collection = self.client.get_collection(
                     name=self.collection_name,
-                    embedding_function=embed_fn
+                    embedding_function=self._embed_doc
                 )
             except Exception:
                 self._collection = self.client.create_collection(
                     name=self.collection_name,
-                    embedding_function=embed_fn
+                    embedding_function=self._embed_doc
                 )
         return self._collection
     
@@ -45,7 +56,8 @@ class VectorStore:
         self,
         documents: List[str],
         ids: List[str] = None,
-        metadatas: List[Dict[str, Any]] = None
+        metadatas: List[Dict[str, Any]] = None,
+        embeddings: List[np.ndarray] = None
     ) -> None:
         """
         Add documents to the collection.
@@ -54,6 +66,7 @@ class VectorStore:
             documents: List of document texts
             ids: Optional list of document IDs
             metadatas: Optional list of metadata dicts
+            embeddings: Optional precomputed vectors (else the collection embeds the documents)
         """
         if ids is None:
             ids = [f"doc_{i}" for i in range(len(documents))]
@@ -61,17 +74,20 @@ class VectorStore:
         if metadatas is None:
             metadatas = [{"source": "unknown"} for _ in documents]
             
-        # Add in batches to avoid memory issues
-        batch_size = 100
+        # Use the largest batch the backend accepts: each add() is one write
+        # transaction, and the embedding function still splits API requests itself
+        batch_size = self.client.get_max_batch_size()
         for i in range(0, len(documents), batch_size):
             batch_docs = documents[i:i + batch_size]
             batch_ids = ids[i:i + batch_size]
             batch_meta = metadatas[i:i + batch_size]
+            batch_emb = embeddings[i:i + batch_size] if embeddings is not None else None
             
             self.collection.add(
                 documents=batch_docs,
                 ids=batch_ids,
-                metadatas=batch_meta
+                metadatas=batch_meta,
+                embeddings=batch_emb
             )
             
     def query(
@@ -93,39 +109,70 @@ class VectorStore:
         Returns:
             Query results with documents, metadatas, and distances
         """
+        return self.query_batch([query_text], n_results, where, include)[0]
+    
+    def query_batch(
+        self,
+        query_texts: List[str],
+        n_results: int = TOP_K_RESULTS,
+        where: Dict[str, Any] = None,
+        include: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Query the collection with several queries in one call.
+        All texts are embedded in one request and searched in one collection query.
+        
+        Args:
+            query_texts: The query strings
+            n_results: Number of results to return per query
+            where: Optional metadata filter
+            include: What to include in results (documents, metadatas, distances)
+            
+        Returns:
+            One result dict per query (same format as query()), in input order
+        """
         if include is None:
-            include = ["documents", "metadatas", "distances"]
+            include = RETRIEVAL_INCLUDE
             
-        # Switch to query mode for retrieval
-        embed_fn = get_embedding_function(document_mode=False)
-        
         try:
+            # Embed in query mode; query_texts would use the collection's document mode
             results = self.collection.query(
-                query_texts=[query_text],
+                query_embeddings=self._embed_query.embed_query(input=query_texts),
                 n_results=n_results,
                 where=where,
                 include=include
             )
         except Exception as e:
             print(f"[VectorStore Query Error] {e}")
-            return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+            results = None
         
+        return [self._unpack(results, i) for i in range(len(query_texts))]
+    
+    @staticmethod
+    def _unpack(results: Optional[Dict[str, Any]], i: int) -> Dict[str, Any]:
+        """Extract the results of the i-th query from a Chroma query response."""
         if not results:
             return {"documents": [], "metadatas": [], "distances": [], "ids": []}
         
-        return {
-            "documents": results.get("documents", [[]])[0] if results.get("documents") else [],
-            "metadatas": results.get("metadatas", [[]])[0] if results.get("metadatas") else [],
-            "distances": results.get("distances", [[]])[0] if results.get("distances") else [],
-            "ids": results.get("ids", [[]])[0] if results.get("ids") else []
+        output = {
+            "documents": results["documents"][i] if results.get("documents") else [],
+            "metadatas": results["metadatas"][i] if results.get("metadatas") else [],
+            "distances": results["distances"][i] if results.get("distances") else [],
+            "ids": results["ids"][i] if results.get("ids") else []
         }
+        # Embeddings may come back as a numpy array, so avoid truthiness checks
+        embeddings = results.get("embeddings")
+        if embeddings is not None and len(embeddings) > 0:
+            output["embeddings"] = embeddings[i]
+        return output
     
     def query_with_filter(
         self,
         query_text: str,
         document_type: str = None,
         source_file: str = None,
-        n_results: int = TOP_K_RESULTS
+        n_results: int = TOP_K_RESULTS,
+        include: List[str] = None
     ) -> Dict[str, Any]:
         """
         Query with common metadata filters.
@@ -135,21 +182,90 @@ class VectorStore:
             document_type: Filter by document type (regulations, academic, etc.)
             source_file: Filter by source file name
             n_results: Number of results to return
+            include: What to include in results (documents, metadatas, distances, embeddings)
             
         Returns:
             Filtered query results
         """
+        return self.query(
+            query_text=query_text,
+            n_results=n_results,
+            where=self.build_filter(document_type, source_file),
+            include=include
+        )
+    
+    @staticmethod
+    def build_filter(document_type: str = None, source_file: str = None) -> Optional[Dict[str, Any]]:
+        """Build a metadata filter from common fields (None if no filter)."""
         where = {}
         if document_type:
             where["document_type"] = document_type
         if source_file:
             where["source"] = source_file
+        return where if where else None
+    
+    async def aquery(
+        self,
+        queries: List[str],
+        n_results: int = TOP_K_RESULTS,
+        where: Dict[str, Any] = None,
+        include: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Query with several phrasings of a question and fuse the rankings.
+        All queries are embedded and searched in one batched call (off the
+        event loop) and merged with Reciprocal Rank Fusion.
+        
+        Args:
+            queries: Query strings (e.g. the question and its rewrite)
+            n_results: Number of fused results to return
+            where: Optional metadata filter
+            include: What to include in results (documents, metadatas, distances, embeddings)
             
-        return self.query(
-            query_text=query_text,
-            n_results=n_results,
-            where=where if where else None
-        )
+        Returns:
+            Fused results in the same format as query()
+        """
+        if include is None:
+            include = RETRIEVAL_INCLUDE
+        
+        results = await asyncio.to_thread(self.query_batch, queries, n_results, where, include)
+        
+        return self._rrf_merge(results, n_results, include)
+    
+    @staticmethod
+    def _rrf_merge(results: List[Dict[str, Any]], n_results: int, include: List[str]) -> Dict[str, Any]:
+        """Merge per-query results (query() format) by Reciprocal Rank Fusion score."""
+        fused: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            ids = result["ids"]
+            distances = result.get("distances")
+            for rank, doc_id in enumerate(ids):
+                entry = fused.get(doc_id)
+                if entry is None:
+                    entry = fused[doc_id] = {"score": 0.0, "hit": (result, rank), "distance": None}
+                entry["score"] += 1.0 / (RRF_K + rank + 1)
+                if distances:
+                    # Keep the closest distance over all phrasings
+                    dist = distances[rank]
+                    if entry["distance"] is None or dist < entry["distance"]:
+                        entry["distance"] = dist
+        
+        ranked = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)[:n_results]
+        
+        output = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+        fields = [f for f in ("documents", "metadatas", "embeddings") if f in include]
+        for field in fields:
+            output[field] = []
+        for doc_id, entry in ranked:
+            result, rank = entry["hit"]
+            output["ids"].append(doc_id)
+            if entry["distance"] is not None:
+                output["distances"].append(entry["distance"])
+            for field in fields:
+                values = result.get(field)
+                if values is not None and len(values) > 0:
+                    output[field].append(values[rank])
+        return output
     
     def get_all_documents(self, limit: int = 100) -> Dict[str, Any]:
         """
@@ -161,7 +277,8 @@ class VectorStore:
         Returns:
             Sample of documents from collection
         """
-        return self.collection.peek(limit=limit)
+        # peek() also returns every embedding, which callers never use
+        return self.collection.get(limit=limit, include=["documents", "metadatas"])
     
     def count(self) -> int:
         """Get total document count in collection."""
@@ -178,9 +295,12 @@ class VectorStore:
 
 
 # Convenience function for getting default store
+@shared_resource
 def get_vector_store(collection_name: str = DEFAULT_COLLECTION) -> VectorStore:
     """
-    Get a vector store instance.
+    Get the shared vector store for a collection.
+    
+    One instance (client and collection handle) serves all sessions and threads.
     
     Args:
         collection_name: Name of collection to use
@@ -1,5 +1,25 @@
-# Database module for the University AI Assistant
-from .faq_cache import FAQCache
-from .operations import DatabaseOperations
+"""Database module for the University AI Assistant."""
+from importlib import import_module
 
-__all__ = ["FAQCache", "DatabaseOperations"]
+__all__ = ["FAQCache", "DatabaseOperations", "SemanticCache"]
+
+# Submodules are imported on first attribute access, so the login screen can
+# use DatabaseOperations without pulling in chromadb via SemanticCache.
+_LAZY_IMPORTS = {
+    "FAQCache": ".faq_cache",
+    "DatabaseOperations": ".operations",
+    "SemanticCache": ".semantic_cache",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -2,16 +2,119 @@
 FAQ Cache Module
 Caches frequently asked questions for faster response times.
 """
-import sqlite3
-import hashlib
-from datetime import datetime, timedelta
+import atexit
+import threading
+import time
+import xxhash
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, Any, Optional, List
-from config import SQLITE_DB_PATH, FAQ_CACHE_TTL_HOURS, MAX_CACHE_SIZE
+from config import (
+    SQLITE_DB_PATH, FAQ_CACHE_TTL_HOURS, MAX_CACHE_SIZE,
+    FAQ_HIT_FLUSH_INTERVAL, FAQ_STATS_REFRESH_INTERVAL
+)
+from core.db_pool import get_pool, BatchWriter
+
+# Identifies how query_hash keys are derived; stored rows with another scheme are dropped
+HASH_SCHEME = "xxh3_128"
+
+# Number of top queries kept in the materialized popular_queries_mv table
+POPULAR_QUERIES_K = 50
+
+# Hot-path statements, kept as constants so every call reuses the cached prepared statement
+SQL_FAQ_GET = """
+    SELECT response, created_at FROM faq_cache
+    WHERE query_hash = ? AND created_at > ?
+"""
+
+SQL_FAQ_UPSERT = """
+    INSERT INTO faq_cache (query_hash, query, response)
+    VALUES (?, ?, ?)
+    ON CONFLICT(query_hash) DO UPDATE SET
+        response = excluded.response,
+        hit_count = hit_count + 1,
+        last_accessed = CURRENT_TIMESTAMP
+"""
+
+SQL_FAQ_ADD_HITS = """
+    UPDATE faq_cache
+    SET hit_count = hit_count + ?,
+        last_accessed = CURRENT_TIMESTAMP
+    WHERE query_hash = ?
+"""
+
+
+@lru_cache(maxsize=4096)
+def _normalize(query: str) -> str:
+    """Normalize a query so trivial variants share one cache key."""
+    # Lowercase, collapse whitespace, drop trailing punctuation
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+class LRUCache:
+    """
+    Bounded in-memory LRU map with per-entry TTL.
+    OrderedDict gives O(1) lookup, recency update and eviction; a lock makes
+    it safe to share across session threads.
+    """
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        """
+        Initialize LRU cache.
+        
+        Args:
+            max_size: Maximum number of entries kept
+            ttl_seconds: Lifetime of an entry
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a live entry, marking it most recently used."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expiry_ts = entry
+            if expiry_ts <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: str, expiry_ts: float = None) -> None:
+        """Store an entry, evicting the least recently used one if full."""
+        if expiry_ts is None:
+            expiry_ts = time.time() + self.ttl_seconds
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            elif len(self._data) >= self.max_size:
+                self._data.popitem(last=False)
+            self._data[key] = (value, expiry_ts)
+    
+    def pop(self, key: str) -> None:
+        """Remove an entry if present."""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
 
 
 class FAQCache:
     """
     Cache for frequently asked questions to reduce redundant LLM calls.
+    Hot entries are served from an in-memory LRU in front of SQLite;
+    writes and hit counts are buffered and committed in batches.
     """
     
     def __init__(self, db_path: str = SQLITE_DB_PATH):
@@ -24,42 +127,98 @@ class FAQCache:
         self.db_path = db_path
         self.ttl_hours = FAQ_CACHE_TTL_HOURS
         self.max_size = MAX_CACHE_SIZE
+        self._memory = LRUCache(self.max_size, self.ttl_hours * 3600)
+        self._pool = get_pool(db_path)
         self._init_db()
+        self._writer = BatchWriter(self._pool, SQL_FAQ_UPSERT)
+        # Size is tracked approximately (seeded in _init_db) and trimmed off the write path
+        self._trim_lock = threading.Lock()
+        self._trimming = False
+        # get_stats/get_popular_queries read tables refreshed by the hit flusher
+        self._stats_refreshed = 0.0
+        # Hit counts are coalesced per key and written by a background thread
+        self._pending_hits: Dict[str, int] = {}
+        self._hits_lock = threading.Lock()
+        threading.Thread(target=self._hit_flusher, name="faq-hit-flusher", daemon=True).start()
+        atexit.register(self._flush_hits)
         
-    def _get_conn(self) -> sqlite3.Connection:
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
-    
     def _init_db(self) -> None:
         """Initialize cache table."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS faq_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                query_hash TEXT UNIQUE NOT NULL,
-                query TEXT NOT NULL,
-                response TEXT NOT NULL,
-                hit_count INTEGER DEFAULT 1,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        c.execute("""
-            CREATE INDEX IF NOT EXISTS idx_query_hash 
-            ON faq_cache(query_hash)
-        """)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+            
+            # Tables from before the WITHOUT ROWID layout have an id column
+            c.execute("PRAGMA table_info(faq_cache)")
+            migrate = "id" in {col[1] for col in c.fetchall()}
+            if migrate:
+                c.execute("DROP INDEX IF EXISTS idx_query_hash")
+                c.execute("ALTER TABLE faq_cache RENAME TO faq_cache_old")
+        
+            # Keyed directly on the hash: one B-tree per lookup, no rowid hop
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS faq_cache (
+                    query_hash TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    hit_count INTEGER DEFAULT 1,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP
+                ) WITHOUT ROWID
+            """)
+            
+            if migrate:
+                c.execute("""
+                    INSERT OR IGNORE INTO faq_cache
+                    (query_hash, query, response, hit_count, created_at, last_accessed)
+                    SELECT query_hash, query, response, hit_count, created_at, last_accessed
+                    FROM faq_cache_old
+                """)
+                c.execute("DROP TABLE faq_cache_old")
+            
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS faq_cache_meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            
+            # Rows keyed by an older hash scheme can never be hit again
+            c.execute("SELECT value FROM faq_cache_meta WHERE key = 'hash_scheme'")
+            row = c.fetchone()
+            if row is None or row[0] != HASH_SCHEME:
+                c.execute("DELETE FROM faq_cache")
+                c.execute("""
+                    INSERT OR REPLACE INTO faq_cache_meta (key, value)
+                    VALUES ('hash_scheme', ?)
+                """, (HASH_SCHEME,))
+            
+            # Materialized statistics, refreshed out of band
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    metric TEXT PRIMARY KEY,
+                    value REAL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS popular_queries_mv (
+                    rank INTEGER PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    hit_count INTEGER,
+                    last_accessed DATETIME
+                )
+            """)
         
-        conn.commit()
-        conn.close()
+            conn.commit()
+            
+            c.execute("SELECT COUNT(*) FROM faq_cache")
+            self._approx_count = c.fetchone()[0]
     
     def _hash_query(self, query: str) -> str:
-        """Generate hash for query normalization."""
-        # Normalize: lowercase, strip whitespace, remove extra spaces
-        normalized = " ".join(query.lower().strip().split())
-        return hashlib.sha256(normalized.encode()).hexdigest()[:32]
+        """Generate hash for query normalization (non-cryptographic, cache key only)."""
+        return xxhash.xxh3_128_hexdigest(_normalize(query).encode())
     
     def get(self, query: str) -> Optional[str]:
         """
@@ -72,34 +231,112 @@ class FAQCache:
             Cached response or None
         """
         query_hash = self._hash_query(query)
-        conn = self._get_conn()
-        c = conn.cursor()
         
-        # Check cache with TTL
-        ttl_cutoff = datetime.now() - timedelta(hours=self.ttl_hours)
+        cached = self._memory.get(query_hash)
+        if cached is not None:
+            self._record_hit(query_hash)
+            return cached
+        
+        # No flush: set() already filled _memory, and rows from other processes may lag a batch
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            SELECT response FROM faq_cache
-            WHERE query_hash = ? AND created_at > ?
-        """, (query_hash, ttl_cutoff))
+            # Check cache with TTL
+            ttl_cutoff = datetime.now() - timedelta(hours=self.ttl_hours)
         
-        row = c.fetchone()
+            c.execute(SQL_FAQ_GET, (query_hash, ttl_cutoff))
+        
+            row = c.fetchone()
         
         if row:
-            # Update hit count and last accessed
-            c.execute("""
-                UPDATE faq_cache
-                SET hit_count = hit_count + 1,
-                    last_accessed = CURRENT_TIMESTAMP
-                WHERE query_hash = ?
-            """, (query_hash,))
-            conn.commit()
-            conn.close()
+            # Expire the in-memory copy together with the stored row (CURRENT_TIMESTAMP is UTC)
+            created_at = datetime.fromisoformat(str(row[1])).replace(tzinfo=timezone.utc).timestamp()
+            self._memory.set(query_hash, row[0], created_at + self.ttl_hours * 3600)
+            self._record_hit(query_hash)
             return row[0]
         
-        conn.close()
         return None
     
+    def _record_hit(self, query_hash: str) -> None:
+        """Count a hit; it is written with the next hit flush."""
+        with self._hits_lock:
+            self._pending_hits[query_hash] = self._pending_hits.get(query_hash, 0) + 1
+    
+    def _hit_flusher(self) -> None:
+        """Write accumulated hit counts and refresh statistics periodically (background thread)."""
+        while True:
+            time.sleep(FAQ_HIT_FLUSH_INTERVAL)
+            self._flush_hits()
+            if time.time() - self._stats_refreshed >= FAQ_STATS_REFRESH_INTERVAL:
+                self._refresh_stats()
+    
+    def _refresh_stats(self) -> None:
+        """Recompute cache_stats and popular_queries_mv from faq_cache."""
+        self._writer.flush(raise_errors=False)
+        self._flush_hits()
+        try:
+            with self._pool.acquire() as conn:
+                c = conn.cursor()
+                
+                # One scan for all aggregates
+                c.execute("""
+                    SELECT 
+                        COUNT(*),
+                        COALESCE(SUM(hit_count), 0),
+                        COALESCE(AVG(hit_count), 0),
+                        COUNT(CASE WHEN created_at > datetime('now', '-1 day') THEN 1 END),
+                        COUNT(CASE WHEN created_at > datetime('now', '-7 days') THEN 1 END)
+                    FROM faq_cache
+                """)
+                row = c.fetchone()
+                metrics = ("total_entries", "total_hits", "average_hits", "entries_last_24h", "entries_last_week")
+                c.executemany("""
+                    INSERT OR REPLACE INTO cache_stats (metric, value, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                """, list(zip(metrics, row)))
+                
+                c.execute("DELETE FROM popular_queries_mv")
+                c.execute("""
+                    INSERT INTO popular_queries_mv (rank, query, response, hit_count, last_accessed)
+                    SELECT ROW_NUMBER() OVER (ORDER BY hit_count DESC), query, response, hit_count, last_accessed
+                    FROM faq_cache
+                    ORDER BY hit_count DESC
+                    LIMIT ?
+                """, (POPULAR_QUERIES_K,))
+                
+                conn.commit()
+            self._stats_refreshed = time.time()
+        except Exception as e:
+            print(f"[FAQCache Stats Error] {e}")
+    
+    def _flush_hits(self) -> None:
+        """Write accumulated hit counts in one transaction."""
+        with self._hits_lock:
+            if not self._pending_hits:
+                return
+            snapshot, self._pending_hits = self._pending_hits, {}
+        try:
+            with self._pool.acquire() as conn:
+                conn.executemany(
+                    SQL_FAQ_ADD_HITS,
+                    [(count, query_hash) for query_hash, count in snapshot.items()]
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"[FAQCache Hit Flush Error] {e}")
+    
+    def flush(self) -> None:
+        """
+        Commit buffered entries and hit counts.
+        
+        Raises:
+            BatchWriteError: If entries were dropped since the last flush()
+        """
+        try:
+            self._writer.flush()
+        finally:
+            self._flush_hits()
+    
     def set(self, query: str, response: str) -> None:
         """
         Cache a query-response pair.
@@ -109,45 +346,48 @@ class FAQCache:
             response: Generated response
         """
         query_hash = self._hash_query(query)
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        # Upsert
-        c.execute("""
-            INSERT INTO faq_cache (query_hash, query, response)
-            VALUES (?, ?, ?)
-            ON CONFLICT(query_hash) DO UPDATE SET
-                response = excluded.response,
-                hit_count = hit_count + 1,
-                last_accessed = CURRENT_TIMESTAMP
-        """, (query_hash, query, response))
-        
-        conn.commit()
-        
-        # Cleanup if over max size
-        self._cleanup_if_needed(conn)
-        
-        conn.close()
+        self._memory.set(query_hash, response)
+        
+        # Upsert with the next batch
+        self._writer.add((query_hash, query, response))
+        
+        # Overcounts on updates of existing keys; the trim recounts exactly
+        with self._trim_lock:
+            self._approx_count += 1
+            start = not self._trimming and self._approx_count > self.max_size * 1.1
+            if start:
+                self._trimming = True
+        if start:
+            threading.Thread(target=self._trim, name="faq-trim", daemon=True).start()
     
-    def _cleanup_if_needed(self, conn: sqlite3.Connection) -> None:
-        """Remove old entries if cache exceeds max size."""
-        c = conn.cursor()
-        
-        c.execute("SELECT COUNT(*) FROM faq_cache")
-        count = c.fetchone()[0]
-        
-        if count > self.max_size:
-            # Remove least recently accessed entries
-            excess = count - self.max_size
-            c.execute("""
-                DELETE FROM faq_cache
-                WHERE id IN (
-                    SELECT id FROM faq_cache
-                    ORDER BY last_accessed ASC
-                    LIMIT ?
-                )
-            """, (excess,))
-            conn.commit()
+    def _trim(self) -> None:
+        """Remove least recently accessed entries beyond max size (background thread)."""
+        try:
+            self._writer.flush(raise_errors=False)
+            with self._pool.acquire() as conn:
+                c = conn.cursor()
+                
+                c.execute("SELECT COUNT(*) FROM faq_cache")
+                count = c.fetchone()[0]
+                
+                if count > self.max_size:
+                    c.execute("""
+                        DELETE FROM faq_cache
+                        WHERE query_hash IN (
+                            SELECT query_hash FROM faq_cache
+                            ORDER BY last_accessed ASC
+                            LIMIT ?
+                        )
+                    """, (count - self.max_size,))
+                    conn.commit()
+                    count = self.max_size
+            with self._trim_lock:
+                self._approx_count = count
+        except Exception as e:
+            print(f"[FAQCache Trim Error] {e}")
+        finally:
+            with self._trim_lock:
+                self._trimming = False
     
     def get_popular_queries(self, limit: int = 10) -> List[Dict]:
         """
@@ -159,28 +399,36 @@ class FAQCache:
         Returns:
             List of popular queries with hit counts
         """
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT query, response, hit_count, last_accessed
-            FROM faq_cache
-            ORDER BY hit_count DESC
-            LIMIT ?
-        """, (limit,))
-        
-        rows = c.fetchall()
-        conn.close()
-        
-        return [
-            {
-                "query": row[0],
-                "response": row[1][:200] + "..." if len(row[1]) > 200 else row[1],
-                "hit_count": row[2],
-                "last_accessed": row[3]
-            }
-            for row in rows
-        ]
+        if limit > POPULAR_QUERIES_K:
+            # Beyond the materialized top-K, sort the live table
+            self._writer.flush(raise_errors=False)
+            self._flush_hits()
+            sql = """
+                SELECT query, response, hit_count, last_accessed
+                FROM faq_cache
+                ORDER BY hit_count DESC
+                LIMIT ?
+            """
+        else:
+            if not self._stats_refreshed:
+                self._refresh_stats()
+            sql = """
+                SELECT query, response, hit_count, last_accessed
+                FROM popular_queries_mv
+                ORDER BY rank
+                LIMIT ?
+            """
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            c.execute(sql, (limit,))
+        
+            queries = [dict(row) for row in c]
+        
+        for entry in queries:
+            if len(entry["response"]) > 200:
+                entry["response"] = entry["response"][:200] + "..."
+        return queries
     
     def invalidate(self, query: str = None) -> int:
         """
@@ -192,58 +440,47 @@ class FAQCache:
         Returns:
             Number of entries invalidated
         """
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        if query:
-            query_hash = self._hash_query(query)
-            c.execute("DELETE FROM faq_cache WHERE query_hash = ?", (query_hash,))
-        else:
-            c.execute("DELETE FROM faq_cache")
+        self._writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            if query:
+                query_hash = self._hash_query(query)
+                c.execute("DELETE FROM faq_cache WHERE query_hash = ?", (query_hash,))
+                self._memory.pop(query_hash)
+            else:
+                c.execute("DELETE FROM faq_cache")
+                self._memory.clear()
+        
+            deleted = c.rowcount
+            conn.commit()
         
-        deleted = c.rowcount
-        conn.commit()
-        conn.close()
+        with self._trim_lock:
+            self._approx_count = max(0, self._approx_count - deleted)
         
         return deleted
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT 
-                COUNT(*) as total_entries,
-                SUM(hit_count) as total_hits,
-                AVG(hit_count) as avg_hits
-            FROM faq_cache
-        """)
+        """Get cache statistics (refreshed every FAQ_STATS_REFRESH_INTERVAL seconds)."""
+        if not self._stats_refreshed:
+            self._refresh_stats()
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        row = c.fetchone()
+            c.execute("SELECT metric, value FROM cache_stats")
         
-        # Entries by age
-        c.execute("""
-            SELECT 
-                COUNT(CASE WHEN created_at > datetime('now', '-1 day') THEN 1 END) as day_old,
-                COUNT(CASE WHEN created_at > datetime('now', '-7 days') THEN 1 END) as week_old,
-                COUNT(*) as total
-            FROM faq_cache
-        """)
-        
-        age_row = c.fetchone()
-        conn.close()
+            stats = dict(c.fetchall())
         
+        total_entries = int(stats.get("total_entries") or 0)
         return {
-            "total_entries": row[0] or 0,
-            "total_hits": row[1] or 0,
-            "average_hits": round(row[2] or 0, 1),
-            "entries_last_24h": age_row[0] or 0,
-            "entries_last_week": age_row[1] or 0,
-            "cache_utilization": round((row[0] or 0) / self.max_size * 100, 1)
+            "total_entries": total_entries,
+            "total_hits": int(stats.get("total_hits") or 0),
+            "average_hits": round(stats.get("average_hits") or 0, 1),
+            "entries_last_24h": int(stats.get("entries_last_24h") or 0),
+            "entries_last_week": int(stats.get("entries_last_week") or 0),
+            "cache_utilization": round(total_entries / self.max_size * 100, 1)
         }
 
-
 # Decorator for caching function results
 def cached_response(cache: FAQCache = None):
     """
@@ -6,6 +6,20 @@ import sqlite3
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from config import SQLITE_DB_PATH
+from core.db_pool import get_pool, BatchWriter
+
+# Login-path statements, kept as constants so every call reuses the cached prepared statement
+SQL_AUTHENTICATE = """
+    SELECT id, username, role, email
+    FROM users
+    WHERE username = ? AND password = ?
+    LIMIT 1
+"""
+
+SQL_UPDATE_LAST_LOGIN = """
+    UPDATE users SET last_login = CURRENT_TIMESTAMP
+    WHERE username = ?
+"""
 
 
 class DatabaseOperations:
@@ -21,35 +35,33 @@ class DatabaseOperations:
             db_path: Path to SQLite database
         """
         self.db_path = db_path
+        self._pool = get_pool(db_path)
         self._init_db()
+        # last_login is written in the background, keeping login read-only
+        self._login_writer = BatchWriter(self._pool, SQL_UPDATE_LAST_LOGIN)
         
-    def _get_conn(self) -> sqlite3.Connection:
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
-    
     def _init_db(self) -> None:
         """Initialize all required tables."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        # Users table
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT DEFAULT 'student',
-                email TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                last_login DATETIME
-            )
-        """)
-        
-        # Create indexes
-        c.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-        
-        conn.commit()
-        conn.close()
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            # Users table
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    role TEXT DEFAULT 'student',
+                    email TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    last_login DATETIME
+                )
+            """)
+        
+            # Create indexes
+            c.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+        
+            conn.commit()
     
     # User Operations
     
@@ -72,20 +84,18 @@ class DatabaseOperations:
         Returns:
             True if created, False if username exists
         """
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        try:
-            c.execute("""
-                INSERT INTO users (username, password, role, email)
-                VALUES (?, ?, ?, ?)
-            """, (username, password, role, email))
-            conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-        finally:
-            conn.close()
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            try:
+                c.execute("""
+                    INSERT INTO users (username, password, role, email)
+                    VALUES (?, ?, ?, ?)
+                """, (username, password, role, email))
+                conn.commit()
+                return True
+            except sqlite3.IntegrityError:
+                return False
     
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
         """
@@ -98,125 +108,85 @@ class DatabaseOperations:
         Returns:
             User dict if authenticated, None otherwise
         """
-        conn = self._get_conn()
-        c = conn.cursor()
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            SELECT id, username, role, email
-            FROM users
-            WHERE username = ? AND password = ?
-        """, (username, password))
+            c.execute(SQL_AUTHENTICATE, (username, password))
         
-        row = c.fetchone()
+            row = c.fetchone()
         
         if row:
-            # Update last login
-            c.execute("""
-                UPDATE users SET last_login = CURRENT_TIMESTAMP
-                WHERE username = ?
-            """, (username,))
-            conn.commit()
-            conn.close()
-            
-            return {
-                "id": row[0],
-                "username": row[1],
-                "role": row[2],
-                "email": row[3]
-            }
-        
-        conn.close()
+            # Update last login with the next background batch
+            self._login_writer.add((username,))
+            return dict(row)
+        
         return None
     
     def get_user(self, username: str) -> Optional[Dict]:
         """Get user by username."""
-        conn = self._get_conn()
-        c = conn.cursor()
+        self._login_writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            SELECT id, username, role, email, created_at, last_login
-            FROM users WHERE username = ?
-        """, (username,))
+            c.execute("""
+                SELECT id, username, role, email, created_at, last_login
+                FROM users WHERE username = ?
+            """, (username,))
         
-        row = c.fetchone()
-        conn.close()
+            row = c.fetchone()
         
-        if row:
-            return {
-                "id": row[0],
-                "username": row[1],
-                "role": row[2],
-                "email": row[3],
-                "created_at": row[4],
-                "last_login": row[5]
-            }
-        return None
+        return dict(row) if row else None
     
     def update_user_role(self, username: str, role: str) -> bool:
         """Update a user's role."""
-        conn = self._get_conn()
-        c = conn.cursor()
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
         
-        c.execute("""
-            UPDATE users SET role = ? WHERE username = ?
-        """, (role, username))
+            c.execute("""
+                UPDATE users SET role = ? WHERE username = ?
+            """, (role, username))
         
-        updated = c.rowcount > 0
-        conn.commit()
-        conn.close()
+            updated = c.rowcount > 0
+            conn.commit()
         return updated
     
     def get_all_users(self, limit: int = 100) -> List[Dict]:
         """Get all users."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT id, username, role, email, created_at, last_login
-            FROM users
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,))
-        
-        rows = c.fetchall()
-        conn.close()
-        
-        return [
-            {
-                "id": row[0],
-                "username": row[1],
-                "role": row[2],
-                "email": row[3],
-                "created_at": row[4],
-                "last_login": row[5]
-            }
-            for row in rows
-        ]
+        self._login_writer.flush(raise_errors=False)
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            c.execute("""
+                SELECT id, username, role, email, created_at, last_login
+                FROM users
+                ORDER BY created_at DESC
+                LIMIT ?
+            """, (limit,))
+        
+            return [dict(row) for row in c]
     
     # Analytics Operations
     
     def get_overall_stats(self) -> Dict[str, Any]:
         """Get overall system statistics."""
-        conn = self._get_conn()
-        c = conn.cursor()
-        
-        # User stats
-        c.execute("SELECT COUNT(*) FROM users")
-        total_users = c.fetchone()[0]
-        
-        c.execute("""
-            SELECT role, COUNT(*) FROM users GROUP BY role
-        """)
-        users_by_role = {row[0]: row[1] for row in c.fetchall()}
-        
-        # Conversation stats (from conversations table if exists)
-        try:
-            c.execute("SELECT COUNT(*) FROM conversations")
-            total_conversations = c.fetchone()[0]
-        except:
-            total_conversations = 0
-        
-        conn.close()
+        with self._pool.acquire() as conn:
+            c = conn.cursor()
+        
+            # User stats
+            c.execute("SELECT COUNT(*) FROM users")
+            total_users = c.fetchone()[0]
+        
+            c.execute("""
+                SELECT role, COUNT(*) FROM users GROUP BY role
+            """)
+            users_by_role = {row[0]: row[1] for row in c.fetchall()}
+        
+            # Conversation stats (from conversations table if exists)
+            try:
+                c.execute("SELECT COUNT(*) FROM conversations")
+                total_conversations = c.fetchone()[0]
+            except:
+                total_conversations = 0
         
         return {
             "total_users": total_users,
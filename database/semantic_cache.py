@@ -0,0 +1,251 @@
+"""
+Semantic Cache Module
+Caches answers by question embedding so paraphrased questions hit the cache.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import chromadb
+import numpy as np
+from typing import Optional
+from config import (
+    CHROMA_DB_PATH, SEMANTIC_CACHE_THRESHOLD, EMBED_USE_BATCHING, FAQ_SEED_PATH,
+    FAQ_CACHE_TTL_HOURS, MAX_CACHE_SIZE
+)
+from core.embeddings import get_embedding_function, get_batched_embedder
+
+SEMANTIC_CACHE_COLLECTION = "faq_semantic_cache"
+
+
+def invalidate_semantic_cache(chroma_client) -> int:
+    """
+    Remove all cached answers, e.g. after the indexed documents changed.
+    Seeded FAQ answers are added back by the next warm_up().
+
+    Args:
+        chroma_client: Client of the Chroma database holding the cache
+
+    Returns:
+        Number of entries removed
+    """
+    try:
+        collection = chroma_client.get_collection(name=SEMANTIC_CACHE_COLLECTION)
+    except Exception:
+        # Not created yet
+        return 0
+    # Entries are deleted rather than the collection, so running apps keep a valid handle
+    ids = collection.get(include=[])["ids"]
+    batch_size = chroma_client.get_max_batch_size()
+    for i in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[i:i + batch_size])
+    return len(ids)
+
+
+class SemanticCache:
+    """
+    Embedding-similarity cache for answers (GPTCache-style).
+
+    The three stages mirror GPTCache: a pre-embedding function that
+    normalizes the question, a similarity evaluation over the nearest
+    cached question, and a Chroma collection as the data manager.
+
+    Like FAQCache, answers expire after FAQ_CACHE_TTL_HOURS and the oldest
+    are trimmed beyond MAX_CACHE_SIZE; seeded FAQ answers never expire.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        """
+        Initialize semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+        """
+        self.threshold = threshold
+        self.ttl_seconds = FAQ_CACHE_TTL_HOURS * 3600
+        self.max_size = MAX_CACHE_SIZE
+        self.embed_fn = get_embedding_function(document_mode=False)
+        self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        self.collection = self.client.get_or_create_collection(
+            name=SEMANTIC_CACHE_COLLECTION,
+            embedding_function=self.embed_fn,
+            metadata={"hnsw:space": "cosine"}
+        )
+        # Size is tracked approximately (seeded here) and trimmed off the write path
+        self._trim_lock = threading.Lock()
+        self._trimming = False
+        self._approx_count = self.collection.count()
+
+    def pre_embedding(self, question: str) -> str:
+        """Normalize a question before embedding it."""
+        return " ".join(question.strip().split())
+
+    def embed(self, question: str) -> np.ndarray:
+        """Embed a question in query mode."""
+        if EMBED_USE_BATCHING:
+            return get_batched_embedder().embed_one_sync(self.pre_embedding(question))
+        return self.embed_fn.embed_query(self.pre_embedding(question))[0]
+
+    def similarity(self, distance: float) -> float:
+        """Convert a cosine distance into a similarity score."""
+        return 1.0 - distance
+
+    def get(self, query_embedding: np.ndarray) -> Optional[str]:
+        """
+        Get the cached answer of the most similar previous question.
+
+        Args:
+            query_embedding: Embedding of the user's question
+
+        Returns:
+            Cached answer or None
+        """
+        try:
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=1,
+                include=["metadatas", "distances"]
+            )
+        except Exception as e:
+            print(f"[SemanticCache Query Error] {e}")
+            return None
+
+        metadatas = results.get("metadatas") or [[]]
+        distances = results.get("distances") or [[]]
+        if not metadatas[0] or not distances[0]:
+            return None
+
+        if self.similarity(distances[0][0]) < self.threshold:
+            return None
+        metadata = metadatas[0][0] or {}
+        created_at = metadata.get("created_at")
+        if created_at is not None and created_at <= time.time() - self.ttl_seconds:
+            return None
+        return metadata.get("response")
+
+    def set(self, question: str, query_embedding: np.ndarray, response: str) -> None:
+        """
+        Cache an answer under the question's embedding.
+
+        Args:
+            question: User's question
+            query_embedding: Embedding of the question
+            response: Generated answer
+        """
+        normalized = self.pre_embedding(question)
+        entry_id = self._entry_id(normalized)
+        try:
+            self.collection.upsert(
+                ids=[entry_id],
+                embeddings=[query_embedding],
+                documents=[normalized],
+                metadatas=[{"response": response, "created_at": time.time()}]
+            )
+        except Exception as e:
+            # e.g. the collection holds embeddings of a different EMBEDDING_DIM
+            print(f"[SemanticCache Set Error] {e}")
+            return
+
+        # Overcounts on updates of existing questions; the trim recounts exactly
+        with self._trim_lock:
+            self._approx_count += 1
+            start = not self._trimming and self._approx_count > self.max_size * 1.1
+            if start:
+                self._trimming = True
+        if start:
+            threading.Thread(target=self._trim, name="semantic-cache-trim", daemon=True).start()
+
+    def _trim(self) -> None:
+        """Remove expired answers, then the oldest beyond max size (background thread)."""
+        try:
+            entries = self.collection.get(include=["metadatas"])
+            cutoff = time.time() - self.ttl_seconds
+            # Seeded answers have no created_at and are kept
+            dated = sorted(
+                (metadata["created_at"], entry_id)
+                for entry_id, metadata in zip(entries["ids"], entries["metadatas"])
+                if metadata and metadata.get("created_at") is not None
+            )
+            expired = sum(1 for created_at, _ in dated if created_at <= cutoff)
+            excess = len(entries["ids"]) - self.max_size
+            remove = [entry_id for _, entry_id in dated[:max(expired, excess)]]
+            if remove:
+                self.collection.delete(ids=remove)
+            with self._trim_lock:
+                self._approx_count = len(entries["ids"]) - len(remove)
+        except Exception as e:
+            print(f"[SemanticCache Trim Error] {e}")
+        finally:
+            with self._trim_lock:
+                self._trimming = False
+
+    @staticmethod
+    def _entry_id(normalized: str) -> str:
+        """Collection id of a normalized question."""
+        return hashlib.md5(normalized.lower().encode()).hexdigest()
+
+    def warm_up(self, seed_path: str = FAQ_SEED_PATH) -> int:
+        """
+        Preload canonical FAQ answers from a JSON file of {"question": "answer"}.
+        Entries are persisted, so only questions not cached yet are embedded,
+        in one batched call.
+
+        Args:
+            seed_path: Path to the seed file (skipped if missing)
+
+        Returns:
+            Number of newly cached questions
+        """
+        if not os.path.exists(seed_path):
+            return 0
+
+        try:
+            with open(seed_path, encoding="utf-8") as f:
+                seed = json.load(f)
+
+            entries = {}
+            for question, response in seed.items():
+                normalized = self.pre_embedding(question)
+                entries[self._entry_id(normalized)] = (normalized, response)
+
+            existing = set(self.collection.get(ids=list(entries), include=[])["ids"])
+            new_ids = [entry_id for entry_id in entries if entry_id not in existing]
+            if not new_ids:
+                return 0
+
+            questions = [entries[entry_id][0] for entry_id in new_ids]
+            self.collection.upsert(
+                ids=new_ids,
+                embeddings=self.embed_fn.embed_query(input=questions),
+                documents=questions,
+                metadatas=[{"response": entries[entry_id][1]} for entry_id in new_ids]
+            )
+        except Exception as e:
+            print(f"[SemanticCache Warm-up Error] {e}")
+            return 0
+
+        print(f"[SemanticCache] Warmed up {len(new_ids)} FAQ entries from {seed_path}")
+        return len(new_ids)
+
+    def clear(self) -> None:
+        """Remove all cached answers."""
+        self.client.delete_collection(name=SEMANTIC_CACHE_COLLECTION)
+        self.collection = self.client.get_or_create_collection(
+            name=SEMANTIC_CACHE_COLLECTION,
+            embedding_function=self.embed_fn,
+            metadata={"hnsw:space": "cosine"}
+        )
+        with self._trim_lock:
+            self._approx_count = 0
+
+
+# Singleton instance
+_semantic_cache = None
+
+def get_semantic_cache() -> SemanticCache:
+    """Get semantic cache singleton."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
@@ -3,10 +3,137 @@ Document Chunker Module
 Enhanced text chunking with metadata preservation.
 """
 import os
-from typing import List, Dict, Any, Tuple
-from PyPDF2 import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from itertools import repeat
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+import xxhash
 from config import CHUNK_SIZE, CHUNK_OVERLAP, PDF_DIRECTORY
+from .pdf_text import cached_pages
+from .splitter import WindowSplitter
+
+# Splitter reused by every file a pool worker processes, keyed by its settings
+_worker_splitter = None
+
+
+def _uint_column() -> array:
+    """Empty unsigned int column."""
+    return array("I")
+
+
+@dataclass
+class ChunkTable:
+    """
+    Chunks and their metadata stored column-wise (one list or array per field).
+    Metadata dicts are only built by to_records(), at the vector store boundary.
+    """
+    chunks: List[str] = field(default_factory=list)
+    source: List[str] = field(default_factory=list)
+    # 1-based page number, 0 for chunks not taken from a PDF page
+    page: array = field(default_factory=_uint_column)
+    chunk_index: array = field(default_factory=_uint_column)
+    document_type: List[str] = field(default_factory=list)
+    total_pages: array = field(default_factory=_uint_column)
+    duplicates: array = field(default_factory=_uint_column)
+    
+    def __len__(self) -> int:
+        return len(self.chunks)
+    
+    def add(
+        self,
+        chunks: List[str],
+        source: str,
+        document_type: str,
+        page: int = 0,
+        total_pages: int = 0
+    ) -> None:
+        """Append the chunks of one page (or text) sharing the same metadata."""
+        n = len(chunks)
+        self.chunks.extend(chunks)
+        self.source.extend(repeat(source, n))
+        self.page.extend(repeat(page, n))
+        self.chunk_index.extend(range(n))
+        self.document_type.extend(repeat(document_type, n))
+        self.total_pages.extend(repeat(total_pages, n))
+        self.duplicates.extend(repeat(0, n))
+    
+    def extend(self, other: "ChunkTable") -> None:
+        """Append all rows of another table."""
+        for f in fields(self):
+            getattr(self, f.name).extend(getattr(other, f.name))
+    
+    def take(self, rows: Iterable[int]) -> "ChunkTable":
+        """New table with the given rows, in the given order."""
+        rows = list(rows)
+        columns = {}
+        for f in fields(self):
+            column = getattr(self, f.name)
+            values = [column[i] for i in rows]
+            columns[f.name] = array(column.typecode, values) if isinstance(column, array) else values
+        return ChunkTable(**columns)
+    
+    def to_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield one metadata dict per chunk."""
+        for i in range(len(self.chunks)):
+            page = self.page[i]
+            record = {"source": self.source[i]}
+            if page:
+                record["page"] = page
+            record["chunk_index"] = self.chunk_index[i]
+            record["document_type"] = self.document_type[i]
+            if page:
+                record["total_pages"] = self.total_pages[i]
+            if self.duplicates[i]:
+                record["duplicates"] = self.duplicates[i]
+            yield record
+
+
+def _build_splitter(chunk_size: int, chunk_overlap: int) -> WindowSplitter:
+    """Create the text splitter used for all document chunking."""
+    return WindowSplitter(chunk_size, chunk_overlap)
+
+
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> WindowSplitter:
+    """Get this process's splitter (also the pool worker initializer)."""
+    global _worker_splitter
+    key = (chunk_size, chunk_overlap)
+    if _worker_splitter is None or _worker_splitter[0] != key:
+        _worker_splitter = (key, _build_splitter(chunk_size, chunk_overlap))
+    return _worker_splitter[1]
+
+
+def _chunk_pdf(
+    splitter: WindowSplitter,
+    file_path: str,
+    document_type: str
+) -> ChunkTable:
+    """Extract and chunk a PDF file page by page with metadata."""
+    pages = cached_pages(file_path)
+    filename = os.path.basename(file_path)
+    total_pages = len(pages)
+    
+    table = ChunkTable()
+    
+    for page_num, text in enumerate(pages, 1):
+        if not text:
+            continue
+            
+        # Chunk this page; its chunks share all metadata but the index
+        table.add(splitter.split_text(text), filename, document_type, page_num, total_pages)
+    
+    return table
+
+
+def _chunk_one(
+    file_path: str,
+    document_type: str,
+    chunk_size: int,
+    chunk_overlap: int
+) -> ChunkTable:
+    """Chunk one PDF in a pool worker (module-level so it can be pickled)."""
+    return _chunk_pdf(_get_splitter(chunk_size, chunk_overlap), file_path, document_type)
 
 
 class DocumentChunker:
@@ -26,11 +153,9 @@ class DocumentChunker:
             chunk_size: Maximum chunk size in characters
             chunk_overlap: Overlap between chunks
         """
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.splitter = _build_splitter(chunk_size, chunk_overlap)
         
     def chunk_pdf(
         self,
@@ -47,32 +172,8 @@ class DocumentChunker:
         Returns:
             Tuple of (chunks list, metadata list)
         """
-        reader = PdfReader(file_path)
-        filename = os.path.basename(file_path)
-        
-        all_chunks = []
-        all_metadata = []
-        
-        for page_num, page in enumerate(reader.pages, 1):
-            text = page.extract_text()
-            if not text:
-                continue
-                
-            # Chunk this page
-            page_chunks = self.splitter.split_text(text)
-            
-            # Create metadata for each chunk
-            for i, chunk in enumerate(page_chunks):
-                all_chunks.append(chunk)
-                all_metadata.append({
-                    "source": filename,
-                    "page": page_num,
-                    "chunk_index": i,
-                    "document_type": document_type,
-                    "total_pages": len(reader.pages)
-                })
-        
-        return all_chunks, all_metadata
+        table = _chunk_pdf(self.splitter, file_path, document_type)
+        return table.chunks, list(table.to_records())
     
     def chunk_text(
         self,
@@ -91,18 +192,10 @@ class DocumentChunker:
         Returns:
             Tuple of (chunks list, metadata list)
         """
-        chunks = self.splitter.split_text(text)
-        
-        metadata = [
-            {
-                "source": source,
-                "chunk_index": i,
-                "document_type": document_type
-            }
-            for i in range(len(chunks))
-        ]
+        table = ChunkTable()
+        table.add(self.splitter.split_text(text), source, document_type)
         
-        return chunks, metadata
+        return table.chunks, list(table.to_records())
     
     def process_pdf_directory(
         self,
@@ -119,29 +212,53 @@ class DocumentChunker:
         Returns:
             Tuple of (all chunks, all metadata)
         """
-        all_chunks = []
-        all_metadata = []
+        table = self._process_directory(directory_path, document_type_mapping)
+        return table.chunks, list(table.to_records())
+    
+    def _process_directory(
+        self,
+        directory_path: str,
+        document_type_mapping: Dict[str, str] = None
+    ) -> ChunkTable:
+        """Chunk all PDFs in a directory into one table."""
+        table = ChunkTable()
         
         document_type_mapping = document_type_mapping or {}
         
-        for filename in os.listdir(directory_path):
-            if not filename.endswith(".pdf"):
-                continue
-                
-            file_path = os.path.join(directory_path, filename)
-            doc_type = document_type_mapping.get(filename, "general")
-            
-            print(f"Processing: {filename}")
+        with os.scandir(directory_path) as it:
+            entries = [e for e in it if e.is_file() and e.name.lower().endswith(".pdf")]
+        if not entries:
+            return table
+        
+        # Extraction is CPU-bound and independent per file, so spread files over processes
+        with ProcessPoolExecutor(
+            max_workers=min(os.cpu_count() or 1, len(entries)),
+            initializer=_get_splitter,
+            initargs=(self.chunk_size, self.chunk_overlap)
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _chunk_one,
+                    entry.path,
+                    document_type_mapping.get(entry.name, "general"),
+                    self.chunk_size,
+                    self.chunk_overlap
+                )
+                for entry in entries
+            ]
             
-            try:
-                chunks, metadata = self.chunk_pdf(file_path, doc_type)
-                all_chunks.extend(chunks)
-                all_metadata.extend(metadata)
-                print(f"  ✓ {len(chunks)} chunks extracted")
-            except Exception as e:
-                print(f"  ✗ Error: {e}")
+            # Collect in directory order; a failing file does not stop the others
+            for entry, future in zip(entries, futures):
+                print(f"Processing: {entry.name}")
+                
+                try:
+                    file_table = future.result()
+                    table.extend(file_table)
+                    print(f"  ✓ {len(file_table)} chunks extracted")
+                except Exception as e:
+                    print(f"  ✗ Error: {e}")
         
-        return all_chunks, all_metadata
+        return table
     
     def chunk_with_context(
         self,
@@ -159,22 +276,30 @@ class DocumentChunker:
             Chunks with context and metadata
         """
         # First get regular chunks
-        base_chunks, base_metadata = self.chunk_pdf(file_path)
+        base = _chunk_pdf(self.splitter, file_path, "general")
+        base_chunks = base.chunks
+        n = len(base_chunks)
         
         enhanced_chunks = []
         enhanced_metadata = []
         
-        for i, chunk in enumerate(base_chunks):
+        # Sliding window of surrounding chunks, updated in O(1) per step
+        window = deque(base_chunks[:context_window + 1])
+        
+        for i, base_record in enumerate(base.to_records()):
             # Build context from surrounding chunks
             start = max(0, i - context_window)
-            end = min(len(base_chunks), i + context_window + 1)
+            end = min(n, i + context_window + 1)
             
-            context_chunks = base_chunks[start:end]
-            enhanced_text = "\n\n".join(context_chunks)
+            enhanced_chunks.append("\n\n".join(window))
             
-            enhanced_chunks.append(enhanced_text)
+            # Slide to the window of chunk i + 1
+            if end < n:
+                window.append(base_chunks[end])
+            if i >= context_window:
+                window.popleft()
             enhanced_metadata.append({
-                **base_metadata[i],
+                **base_record,
                 "context_range": f"{start}-{end}",
                 "primary_chunk_index": i
             })
@@ -182,6 +307,31 @@ class DocumentChunker:
         return enhanced_chunks, enhanced_metadata
 
 
+def _dedupe_chunks(table: ChunkTable) -> ChunkTable:
+    """
+    Drop verbatim repeats of a chunk (headers, footers, legal notices).
+    The first occurrence is kept and records how many copies were dropped.
+    """
+    seen: Dict[bytes, int] = {}
+    keep = []
+    copies = []
+    
+    for row, chunk in enumerate(table.chunks):
+        key = xxhash.xxh3_64(chunk.encode("utf-8")).digest()
+        first = seen.get(key)
+        if first is None:
+            seen[key] = len(keep)
+            keep.append(row)
+            copies.append(0)
+        else:
+            copies[first] += 1
+    
+    unique = table.take(keep)
+    for i, n in enumerate(copies):
+        unique.duplicates[i] += n
+    return unique
+
+
 def ingest_documents(
     pdf_directory: str = PDF_DIRECTORY,
     collection_name: str = "university"
@@ -199,18 +349,38 @@ def ingest_documents(
     from core.vector_store import get_vector_store
     
     chunker = DocumentChunker()
-    chunks, metadata = chunker.process_pdf_directory(pdf_directory)
+    table = chunker._process_directory(pdf_directory)
     
-    if not chunks:
+    if not len(table):
         print("No documents to ingest")
         return 0
     
-    # Generate IDs
-    ids = [f"doc_{i}" for i in range(len(chunks))]
+    # Embed each distinct chunk once
+    total = len(table)
+    table = _dedupe_chunks(table)
+    if len(table) < total:
+        print(f"Skipped {total - len(table)} duplicate chunks")
+    
+    # Content-addressed IDs, so re-ingesting skips chunks already indexed
+    ids = [xxhash.xxh3_64_hexdigest(chunk.encode("utf-8")) for chunk in table.chunks]
     
-    # Add to vector store
     vector_store = get_vector_store(collection_name)
-    vector_store.add_documents(chunks, ids, metadata)
+    present = set(vector_store.collection.get(ids=ids, include=[])["ids"])
+    if present:
+        rows = [i for i, chunk_id in enumerate(ids) if chunk_id not in present]
+        table = table.take(rows)
+        ids = [ids[i] for i in rows]
+        print(f"Skipped {len(present)} chunks already indexed")
+    
+    # Add to vector store; metadata dicts are only built here
+    if len(table):
+        # Embedded up front in one call, so a large corpus can go through the Batch API
+        embeddings = vector_store._embed_doc.embed_documents(table.chunks)
+        vector_store.add_documents(table.chunks, ids, list(table.to_records()), embeddings)
+        
+        # Cached answers may predate the new chunks
+        from database.semantic_cache import invalidate_semantic_cache
+        invalidate_semantic_cache(vector_store.client)
     
-    print(f"✓ Ingested {len(chunks)} chunks into '{collection_name}'")
-    return len(chunks)
+    print(f"✓ Ingested {len(table)} chunks into '{collection_name}'")
+    return len(table)
@@ -4,8 +4,26 @@ Extracts and classifies document metadata for better organization.
 """
 import os
 import re
+from collections import Counter
 from typing import Dict, Any, List, Optional
-from PyPDF2 import PdfReader
+from .pdf_text import load_pdf_sample
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def _build_automaton(patterns: Dict[str, List[str]]):
+    """Compile all classification keywords into one Aho-Corasick automaton."""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for doc_type, keywords in patterns.items():
+        for keyword in keywords:
+            automaton.add_word(keyword, (doc_type, keyword))
+    automaton.make_automaton()
+    return automaton
 
 
 class MetadataExtractor:
@@ -37,39 +55,74 @@ class MetadataExtractor:
         ]
     }
     
-    def extract_pdf_metadata(self, file_path: str) -> Dict[str, Any]:
+    # Built once per process; finds every keyword hit in a single pass over the text
+    _AC = _build_automaton(DOCUMENT_PATTERNS)
+    
+    # Filenames spell keywords with "_" or "-" for spaces; normalized for the automaton
+    _FILENAME_SEPARATORS = str.maketrans("_-", "  ")
+    
+    # Keywords as bytes, for when the automaton is unavailable
+    _KW_BYTES = {
+        doc_type: [kw.encode("utf-8") for kw in keywords]
+        for doc_type, keywords in DOCUMENT_PATTERNS.items()
+    }
+    
+    # Filename spellings per keyword, for when the automaton is unavailable
+    _FILENAME_KEYS = {
+        doc_type: [(kw.replace(" ", "_"), kw.replace(" ", "-")) for kw in keywords]
+        for doc_type, keywords in DOCUMENT_PATTERNS.items()
+    }
+    
+    # Capitalized phrases (likely proper nouns/titles)
+    _PHRASE_RE = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b')
+    
+    # Common words never reported as keywords
+    _STOPWORDS = frozenset({
+        "The", "This", "That", "These", "Those", "And", "For",
+        "With", "From", "Into", "During", "Before", "After"
+    })
+    
+    # Pages and characters of text sampled for classification and keyword extraction
+    SAMPLE_MAX_PAGES = 3
+    SAMPLE_CHAR_BUDGET = 20_000
+    
+    def extract_pdf_metadata(self, file_path: str, file_size: Optional[int] = None) -> Dict[str, Any]:
         """
         Extract metadata from a PDF file.
         
         Args:
             file_path: Path to PDF file
+            file_size: File size in bytes, if already known (saves a stat call)
             
         Returns:
             Metadata dictionary
         """
-        reader = PdfReader(file_path)
+        # Only the sampled pages are parsed, unless the full text is already cached
+        pages, total_pages, info = load_pdf_sample(file_path, self.SAMPLE_MAX_PAGES, self.SAMPLE_CHAR_BUDGET)
         filename = os.path.basename(file_path)
+        if file_size is None:
+            file_size = os.path.getsize(file_path)
         
         # Basic file metadata
         metadata = {
             "source": filename,
             "file_path": file_path,
-            "total_pages": len(reader.pages),
-            "file_size_kb": round(os.path.getsize(file_path) / 1024, 1)
+            "total_pages": total_pages,
+            "file_size_kb": round(file_size / 1024, 1)
         }
         
         # PDF info metadata
-        if reader.metadata:
+        if info:
             metadata.update({
-                "title": reader.metadata.get("/Title", ""),
-                "author": reader.metadata.get("/Author", ""),
-                "subject": reader.metadata.get("/Subject", ""),
-                "creator": reader.metadata.get("/Creator", ""),
-                "creation_date": str(reader.metadata.get("/CreationDate", ""))
+                "title": info.get("Title", ""),
+                "author": info.get("Author", ""),
+                "subject": info.get("Subject", ""),
+                "creator": info.get("Creator", ""),
+                "creation_date": str(info.get("CreationDate", ""))
             })
         
         # Extract and analyze content
-        text_sample = self._extract_text_sample(reader)
+        text_sample = self._extract_text_sample(pages)
         metadata["document_type"] = self._classify_document(text_sample, filename)
         metadata["keywords"] = self._extract_keywords(text_sample)
         
@@ -77,16 +130,19 @@ class MetadataExtractor:
     
     def _extract_text_sample(
         self,
-        reader: PdfReader,
+        pages: List[str],
         max_pages: int = 3
     ) -> str:
-        """Extract text sample from first few pages."""
+        """Extract text sample from first few pages, stopping once the budget is filled."""
         text_parts = []
+        budget = self.SAMPLE_CHAR_BUDGET
         
-        for i, page in enumerate(reader.pages[:max_pages]):
-            text = page.extract_text()
+        for text in pages[:max_pages]:
             if text:
                 text_parts.append(text)
+                budget -= len(text)
+                if budget <= 0:
+                    break
         
         return " ".join(text_parts)
     
@@ -104,19 +160,29 @@ class MetadataExtractor:
         text_lower = text.lower()
         filename_lower = filename.lower()
         
-        scores = {}
-        
-        for doc_type, keywords in self.DOCUMENT_PATTERNS.items():
-            score = 0
-            for keyword in keywords:
-                # Check in text
-                if keyword in text_lower:
-                    score += text_lower.count(keyword)
-                # Bonus for filename match
-                if keyword.replace(" ", "_") in filename_lower or keyword.replace(" ", "-") in filename_lower:
-                    score += 5
-            
-            scores[doc_type] = score
+        scores = Counter({doc_type: 0 for doc_type in self.DOCUMENT_PATTERNS})
+        
+        # Count keyword occurrences in text
+        if self._AC is not None:
+            for _, (doc_type, _keyword) in self._AC.iter(text_lower):
+                scores[doc_type] += 1
+        else:
+            # Keywords are ASCII, so byte counts over UTF-8 equal str counts (and are faster)
+            text_bytes = text_lower.encode("utf-8")
+            for doc_type, keywords in self._KW_BYTES.items():
+                for keyword in keywords:
+                    scores[doc_type] += text_bytes.count(keyword)
+        
+        # Bonus for filename match (once per matching keyword)
+        if self._AC is not None:
+            filename_words = filename_lower.translate(self._FILENAME_SEPARATORS)
+            for doc_type, _keyword in {hit for _, hit in self._AC.iter(filename_words)}:
+                scores[doc_type] += 5
+        else:
+            for doc_type, spellings in self._FILENAME_KEYS.items():
+                for underscored, hyphenated in spellings:
+                    if underscored in filename_lower or hyphenated in filename_lower:
+                        scores[doc_type] += 5
         
         # Return type with highest score (or 'general' if no matches)
         if max(scores.values()) > 0:
@@ -127,25 +193,16 @@ class MetadataExtractor:
         """Extract key terms from document."""
         # Simple keyword extraction based on capitalized terms and common patterns
         
-        # Find capitalized phrases (likely proper nouns/titles)
-        phrases = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', text)
+        # Count capitalized phrases straight from the match iterator; common
+        # words are dropped before counting, so the Counter never holds them
+        stopwords = self._STOPWORDS
+        phrases = (m.group(0) for m in self._PHRASE_RE.finditer(text))
+        phrase_counts = Counter(p for p in phrases if p not in stopwords)
         
-        # Count occurrences
-        from collections import Counter
-        phrase_counts = Counter(phrases)
-        
-        # Filter out common words
-        stopwords = {
-            "The", "This", "That", "These", "Those", "And", "For",
-            "With", "From", "Into", "During", "Before", "After"
-        }
-        
-        keywords = [
-            phrase for phrase, count in phrase_counts.most_common(max_keywords * 2)
-            if phrase not in stopwords and count > 1
+        return [
+            phrase for phrase, count in phrase_counts.most_common(max_keywords)
+            if count > 1
         ]
-        
-        return keywords[:max_keywords]
     
     def batch_extract(self, directory_path: str) -> List[Dict[str, Any]]:
         """
@@ -159,14 +216,15 @@ class MetadataExtractor:
         """
         results = []
         
-        for filename in os.listdir(directory_path):
-            if not filename.endswith(".pdf"):
-                continue
-                
-            file_path = os.path.join(directory_path, filename)
+        # DirEntry caches its stat result, so the file size costs no extra syscall
+        with os.scandir(directory_path) as it:
+            entries = [e for e in it if e.is_file() and e.name.lower().endswith(".pdf")]
+        
+        for entry in entries:
+            filename = entry.name
             
             try:
-                metadata = self.extract_pdf_metadata(file_path)
+                metadata = self.extract_pdf_metadata(entry.path, entry.stat().st_size)
                 results.append(metadata)
             except Exception as e:
                 print(f"Error processing {filename}: {e}")
@@ -205,7 +263,6 @@ class MetadataExtractor:
         for m in metadata_list:
             all_keywords.extend(m.get("keywords", []))
         
-        from collections import Counter
         top_keywords = Counter(all_keywords).most_common(20)
         
         return {
@@ -0,0 +1,164 @@
+"""
+PDF Text Module
+Page text extraction with PDFium, shared by all document loaders.
+Extracted text is cached on disk, keyed by a hash of the file contents;
+samples of the first pages are extracted lazily without filling the cache.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+import pypdfium2 as pdfium
+from config import PDF_TEXT_CACHE_DIR
+
+
+def page_text(page: pdfium.PdfPage) -> str:
+    """
+    Extract the text of one PDF page.
+    
+    Args:
+        page: Open PDFium page
+        
+    Returns:
+        Page text with "\\n" line breaks (PDFium emits "\\r\\n")
+    """
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range().replace("\r\n", "\n")
+    finally:
+        textpage.close()
+
+
+def _extract(source) -> Tuple[List[str], Dict[str, str]]:
+    """Extract the page texts and info dictionary of a PDF."""
+    pdf = pdfium.PdfDocument(source)
+    try:
+        pages = []
+        for page in pdf:
+            pages.append(page_text(page))
+            page.close()
+        return pages, pdf.get_metadata_dict()
+    finally:
+        pdf.close()
+
+
+def _read_source(source) -> Tuple[bytes, str]:
+    """Read a PDF's bytes and locate its cache file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            data = f.read()
+        suffix = f"-{int(os.path.getmtime(source))}"
+    else:
+        data = source.read()
+        suffix = ""
+    
+    key = hashlib.blake2b(data, digest_size=16).hexdigest() + suffix
+    return data, os.path.join(PDF_TEXT_CACHE_DIR, f"{key}.json")
+
+
+def _read_cache(cache_path: str) -> Optional[Tuple[List[str], Dict[str, str]]]:
+    """Cached (pages, info) of a PDF, or None if not cached yet."""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        return cached["pages"], cached["info"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_pdf_text(source) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Get the page texts and info dictionary of a PDF, using the on-disk cache.
+    
+    Args:
+        source: File path or binary file object
+        
+    Returns:
+        Tuple of (one string per page, PDF info dictionary)
+    """
+    data, cache_path = _read_source(source)
+    
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        return cached
+    
+    pages, info = _extract(data)
+    
+    try:
+        os.makedirs(PDF_TEXT_CACHE_DIR, exist_ok=True)
+        # Write then rename, so concurrent pool workers never read a partial file
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": pages, "info": info}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"[PDF Cache Error] {e}")
+    
+    return pages, info
+
+
+def load_pdf_sample(
+    source,
+    max_pages: int,
+    max_chars: int
+) -> Tuple[List[str], int, Dict[str, str]]:
+    """
+    Get the text of the first pages of a PDF, stopping at a page or character budget.
+    
+    A cached full extraction is reused; otherwise only the sampled pages are
+    parsed, and nothing is written to the cache.
+    
+    Args:
+        source: File path or binary file object
+        max_pages: Maximum pages to return
+        max_chars: Stop after the page that brings the sample to this many characters
+        
+    Returns:
+        Tuple of (sampled page texts, total page count, PDF info dictionary)
+    """
+    data, cache_path = _read_source(source)
+    
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        pages, info = cached
+        total_pages = len(pages)
+        pages = pages[:max_pages]
+    else:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            total_pages = len(pdf)
+            info = pdf.get_metadata_dict()
+            pages = []
+            chars = 0
+            for index in range(min(max_pages, total_pages)):
+                page = pdf[index]
+                try:
+                    pages.append(page_text(page))
+                finally:
+                    page.close()
+                chars += len(pages[-1])
+                if chars >= max_chars:
+                    break
+        finally:
+            pdf.close()
+    
+    sample = []
+    for text in pages:
+        sample.append(text)
+        max_chars -= len(text)
+        if max_chars <= 0:
+            break
+    return sample, total_pages, info
+
+
+def cached_pages(source) -> List[str]:
+    """
+    Get the text of every page of a PDF, using the on-disk cache.
+    
+    Args:
+        source: File path or binary file object
+        
+    Returns:
+        One string per page, in page order ("" for pages without text)
+    """
+    return load_pdf_text(source)[0]
@@ -0,0 +1,87 @@
+"""
+Text Splitter Module
+Single-pass windowed text splitter with separator-aware boundaries.
+"""
+from typing import List
+
+# Preferred chunk boundaries, coarsest first; a hard cut is the last resort
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+def fast_split(text: str, size: int, overlap: int) -> List[str]:
+    """
+    Split text into chunks of at most `size` characters in one pass.
+    
+    Each chunk ends at the coarsest separator found in the second half of
+    its window, and the next chunk starts `overlap` characters earlier
+    (moved forward to a word start).
+    
+    Args:
+        text: Text to split
+        size: Maximum chunk size in characters
+        overlap: Characters shared by consecutive chunks (less than size)
+        
+    Returns:
+        List of non-empty, whitespace-stripped chunks
+    """
+    n = len(text)
+    chunks = []
+    start = 0
+    
+    while start < n:
+        end = min(start + size, n)
+        
+        if end < n:
+            # Only look back half a window, so chunks stay reasonably full
+            low = start + size // 2
+            for sep in SEPARATORS:
+                i = text.rfind(sep, low, end)
+                if i != -1:
+                    end = i + len(sep)
+                    break
+        
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= n:
+            break
+        
+        next_start = end - overlap
+        if next_start <= start:
+            # Overlap longer than a shortened chunk: step from the full window's end instead
+            next_start = start + size - overlap
+        if overlap:
+            # Begin the overlap on a word boundary
+            space = text.find(" ", next_start, end)
+            if space != -1:
+                next_start = space + 1
+        start = max(next_start, start + 1)
+    
+    return chunks
+
+
+class WindowSplitter:
+    """
+    Splitter object wrapping fast_split (same split_text() interface as
+    LangChain splitters).
+    """
+    
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        """
+        Initialize splitter.
+        
+        Args:
+            chunk_size: Maximum chunk size in characters
+            chunk_overlap: Overlap between chunks
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
+                f"({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+    
+    def split_text(self, text: str) -> List[str]:
+        """Split text into overlapping chunks."""
+        return fast_split(text, self.chunk_size, self.chunk_overlap)
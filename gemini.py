@@ -8,6 +8,7 @@ import os
 from GeminiEmbeddingFunction import GeminiEmbeddingFunction  
 load_dotenv()
 from config import GEMINI_API_KEY, LLM_MODEL
+from core.resources import shared_resource
 client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 try:
     _masked = (GEMINI_API_KEY[:6] + "..." + GEMINI_API_KEY[-4:]) if GEMINI_API_KEY else "(none)"
@@ -15,8 +16,15 @@ except Exception:
     _masked = "(masked)"
 print(f"[gemini.py] Initialized client model={LLM_MODEL}, api_key={_masked}")
 
+
+# Collection handle, opened once per process instead of per query
+@shared_resource
+def _db():
+    return get_db()
+
+
 def chat(query):
-    db = get_db()
+    db = _db()
 
     # Example query
     
@@ -39,9 +47,9 @@ Be sure to give complete answers with useful background context, and keep your t
     """
 
     
-    for passage in all_passages:
-        passage_oneline = passage.replace("\n", " ")
-        prompt += f"PASSAGE: {passage_oneline}\n"
+    # One join instead of growing the prompt string once per passage
+    passages_oneline = (passage.replace("\n", " ") for passage in all_passages)
+    prompt += "".join(f"PASSAGE: {passage}\n" for passage in passages_oneline)
 
    
     response = client.models.generate_content(
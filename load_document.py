@@ -2,51 +2,199 @@
 Document Loader
 Extracts, chunks and indexes PDF documents into ChromaDB.
 """
+import asyncio
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import chromadb
+import xxhash
 from text_chunk import extract_and_chunk_pdfs_from_dir
-from GeminiEmbeddingFunction import GeminiEmbeddingFunction
-from config import CHROMA_DB_PATH, PDF_DIRECTORY, DEFAULT_COLLECTION
+from GeminiEmbeddingFunction import GeminiEmbeddingFunction, EmbeddingRateLimitError
+from database.semantic_cache import invalidate_semantic_cache
+from config import CHROMA_DB_PATH, PDF_DIRECTORY, DEFAULT_COLLECTION, EMBEDDING_MODEL, EMBEDDING_DIM
 
 DB_NAME = DEFAULT_COLLECTION
 PDF_DIR = PDF_DIRECTORY
-BATCH_SIZE = 50
-BATCH_DELAY = 60  # seconds between batches
+# Stored on the collection; vectors from another model or size cannot be mixed in
+EMBEDDING_SIGNATURE = f"{EMBEDDING_MODEL}@{EMBEDDING_DIM}"
+MAX_ADD_RETRIES = 5
+MAX_ADD_BACKOFF = 60  # seconds
+# Embedding requests are latency-bound, so keep several in flight per PDF
+EMBED_SUB_BATCH = 32
+EMBED_CONCURRENCY = 16
+# PDFs buffered between pipeline stages (backpressure on faster stages)
+PIPELINE_DEPTH = 4
+
+# End-of-stream marker passed down the pipeline
+_DONE = object()
+
+
+def _embed_with_backoff(embed_fn, documents):
+    """Embed documents, backing off exponentially only when rate limited."""
+    for attempt in range(MAX_ADD_RETRIES):
+        try:
+            return embed_fn(documents)
+        # Other failures (bad input, auth) are permanent; retrying only repeats the API calls
+        except EmbeddingRateLimitError:
+            if attempt == MAX_ADD_RETRIES - 1:
+                raise
+            wait = min(MAX_ADD_BACKOFF, 2 ** attempt)
+            print(f"  ⏳ Rate limited, retrying in {wait}s...")
+            time.sleep(wait)
+
+
+async def aembed_documents(embed_fn, documents):
+    """
+    Embed documents in concurrent sub-batches, preserving order.
+    The embedding function is blocking, so sub-batches run on a dedicated pool
+    (its size caps the requests in flight); the function's shared rate limiter
+    still paces the API.
+    """
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _embed_with_backoff, embed_fn, documents[i:i + EMBED_SUB_BATCH])
+            for i in range(0, len(documents), EMBED_SUB_BATCH)
+        ))
+    return [vector for batch in results for vector in batch]
+
+
+def _put(outbox, item, stop):
+    """Hand an item downstream; gives up (returns False) if the queue stays full once the pipeline is stopped."""
+    while True:
+        try:
+            outbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            if stop.is_set():
+                return False
+
+
+def _chunk_id(chunk):
+    """Content-addressed chunk ID: unchanged chunks keep their ID across runs."""
+    return xxhash.xxh3_64_hexdigest(chunk.encode("utf-8"))
+
+
+def _open_collection(chroma_client, embed_fn):
+    """Open the collection, rebuilding it if it was indexed with another embedding setup."""
+    metadata = {"embedding": EMBEDDING_SIGNATURE}
+    try:
+        db = chroma_client.get_or_create_collection(name=DB_NAME, embedding_function=embed_fn, metadata=metadata)
+    except ValueError:
+        # Persisted with a different embedding function configuration
+        db = None
+    if db is None or (db.metadata or {}).get("embedding") != EMBEDDING_SIGNATURE:
+        print(f"🗑️  Rebuilding collection '{DB_NAME}' for {EMBEDDING_SIGNATURE}")
+        chroma_client.delete_collection(name=DB_NAME)
+        db = chroma_client.create_collection(name=DB_NAME, embedding_function=embed_fn, metadata=metadata)
+    return db
 
 
 def load_documents():
-    """Delete old collections and re-index all PDFs."""
+    """Index all PDFs, embedding only chunks not already in the collection."""
     embed_fn = GeminiEmbeddingFunction()
     embed_fn.document_mode = True
 
     chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    db = _open_collection(chroma_client, embed_fn)
+    print(f"✅ Collection '{DB_NAME}' initialized.")
 
-    # Delete existing collections
-    for col in chroma_client.list_collections():
-        col_name = col if isinstance(col, str) else col.name
-        print(f"🗑️  Deleting old collection: {col_name}")
-        chroma_client.delete_collection(name=col_name)
+    # Three overlapping stages: chunk PDFs -> embed chunks -> add to Chroma
+    chunked = queue.Queue(maxsize=PIPELINE_DEPTH)
+    embedded = queue.Queue(maxsize=PIPELINE_DEPTH)
+    errors = []
+    # Set on the first failure in any stage; the others stop at their next item
+    stop = threading.Event()
+    duplicates = 0
+    unchanged = 0
+    # IDs of every chunk in the current PDFs; anything else in the collection is stale
+    seen = set()
 
-    # Create fresh collection
-    db = chroma_client.create_collection(name=DB_NAME, embedding_function=embed_fn)
-    print(f"✅ Collection '{DB_NAME}' initialized.")
+    def chunk_stage():
+        nonlocal duplicates
+        # Boilerplate repeats verbatim across PDFs; embed and store each chunk once
+        try:
+            for file_id, chunks in extract_and_chunk_pdfs_from_dir(PDF_DIR):
+                if stop.is_set():
+                    break
+                unique_chunks, ids = [], []
+                for chunk in chunks:
+                    chunk_id = _chunk_id(chunk)
+                    if chunk_id in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(chunk_id)
+                    unique_chunks.append(chunk)
+                    ids.append(chunk_id)
+                if unique_chunks and not _put(chunked, (file_id, unique_chunks, ids), stop):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(chunked, _DONE, stop)
+
+    def embed_stage():
+        nonlocal unchanged
+        try:
+            while (item := chunked.get()) is not _DONE and not stop.is_set():
+                file_id, chunks, ids = item
+                # Chunks indexed by an earlier run are not embedded again
+                present = set(db.get(ids=ids, include=[])["ids"])
+                if present:
+                    unchanged += len(present)
+                    new = [(c, i) for c, i in zip(chunks, ids) if i not in present]
+                    if not new:
+                        continue
+                    chunks, ids = map(list, zip(*new))
+                embeddings = asyncio.run(aembed_documents(embed_fn, chunks))
+                if not _put(embedded, (file_id, chunks, ids, embeddings), stop):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(embedded, _DONE, stop)
+
+    stages = [
+        threading.Thread(target=chunk_stage, name="ingest-chunk", daemon=True),
+        threading.Thread(target=embed_stage, name="ingest-embed", daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
 
-    # Extract and chunk PDFs
     print("⏳ Extracting and chunking PDFs...")
-    documents = extract_and_chunk_pdfs_from_dir(PDF_DIR)
-    ids = [f"doc_{i}" for i in range(len(documents))]
-
-    # Add in batches with rate-limit delays
-    for i in range(0, len(documents), BATCH_SIZE):
-        batch_docs = documents[i:i + BATCH_SIZE]
-        batch_ids = ids[i:i + BATCH_SIZE]
-        print(f"  📦 Adding batch {i // BATCH_SIZE + 1} ({len(batch_docs)} chunks)...")
-        db.add(documents=batch_docs, ids=batch_ids)
-        if i + BATCH_SIZE < len(documents):
-            print(f"  ⏳ Waiting {BATCH_DELAY}s for rate limit...")
-            time.sleep(BATCH_DELAY)
-
-    print(f"✅ {len(documents)} chunks added to the DB.")
+    total = 0
+    try:
+        while (item := embedded.get()) is not _DONE and not stop.is_set():
+            file_id, chunks, ids, embeddings = item
+            print(f"  📦 Adding {file_id} ({len(chunks)} chunks)...")
+            # Vectors are passed in, so Chroma does not embed again
+            db.upsert(documents=chunks, ids=ids, embeddings=embeddings)
+            total += len(chunks)
+    except Exception as e:
+        errors.append(e)
+        # Stop chunking and embedding instead of spending API quota on discarded vectors
+        stop.set()
+
+    for stage in stages:
+        stage.join()
+    if errors:
+        raise errors[0]
+
+    # Drop chunks of PDFs that were changed or removed since the last run
+    stale = [chunk_id for chunk_id in db.get(include=[])["ids"] if chunk_id not in seen]
+    batch_size = chroma_client.get_max_batch_size()
+    for i in range(0, len(stale), batch_size):
+        db.delete(ids=stale[i:i + batch_size])
+
+    # Cached answers may quote documents that just changed
+    if total or stale:
+        invalidate_semantic_cache(chroma_client)
+
+    print(f"✅ {total} chunks added to the DB "
+          f"({unchanged} unchanged, {len(stale)} stale removed, {duplicates} duplicates skipped).")
 
 
 if __name__ == "__main__":
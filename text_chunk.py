@@ -3,32 +3,64 @@ Text Chunking Utilities
 Extracts text from PDFs and splits into chunks for embedding.
 """
 import os
-from PyPDF2 import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from concurrent.futures import ProcessPoolExecutor
 from config import CHUNK_SIZE, CHUNK_OVERLAP
+from document_processing.pdf_text import cached_pages
+from document_processing.splitter import WindowSplitter
+
+# Splitter built once per pool worker by _init_worker
+_worker_splitter = None
+
+
+def _extract_text(file):
+    """Extract the text of all pages of a PDF (path or binary file object)."""
+    return "\n".join(text for text in cached_pages(file) if text)
 
 
 def extract_and_chunk_pdf(file, chunk_size=None, chunk_overlap=None):
     """Extract text from a single PDF and split into chunks."""
-    reader = PdfReader(file)
-    text = "\n".join(
-        page.extract_text() for page in reader.pages if page.extract_text()
-    )
-    splitter = RecursiveCharacterTextSplitter(
+    splitter = WindowSplitter(
         chunk_size=chunk_size or CHUNK_SIZE,
         chunk_overlap=chunk_overlap or CHUNK_OVERLAP,
     )
-    return splitter.split_text(text)
+    return splitter.split_text(_extract_text(file))
+
+
+def _init_worker():
+    """Create the splitter shared by all files a pool worker processes."""
+    global _worker_splitter
+    _worker_splitter = WindowSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+    )
+
+
+def _chunk_one(file_path):
+    """Extract and chunk one PDF in a pool worker (module-level so it can be pickled)."""
+    # Pass the path so the text cache can key on its mtime as well
+    return _worker_splitter.split_text(_extract_text(file_path))
 
 
 def extract_and_chunk_pdfs_from_dir(directory_path):
-    """Extract and chunk all PDFs in a directory."""
-    all_chunks = []
-    for filename in sorted(os.listdir(directory_path)):
-        if filename.lower().endswith(".pdf"):
-            file_path = os.path.join(directory_path, filename)
-            with open(file_path, "rb") as file:
-                chunks = extract_and_chunk_pdf(file)
-                all_chunks.extend(chunks)
-    return all_chunks
+    """
+    Extract and chunk all PDFs in a directory.
+    Yields (file_id, chunks) per PDF as soon as it is chunked, file_id being
+    the file name without extension.
+    """
+    with os.scandir(directory_path) as it:
+        entries = sorted(
+            (e for e in it if e.is_file() and e.name.lower().endswith(".pdf")),
+            key=lambda e: e.name,
+        )
+    if not entries:
+        return
+    filenames = [entry.name for entry in entries]
+    file_paths = [entry.path for entry in entries]
+    # Extraction is CPU-bound and independent per file; map() keeps the sorted order
+    with ProcessPoolExecutor(
+        max_workers=min(os.cpu_count() or 1, len(file_paths)),
+        initializer=_init_worker,
+    ) as executor:
+        for filename, chunks in zip(filenames, executor.map(_chunk_one, file_paths)):
+            yield os.path.splitext(filename)[0], chunks
 